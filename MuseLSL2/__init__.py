@@ -1 +1,10 @@
 __version__ = "0.0.1"
+
+
+def __getattr__(name):
+    # Imported on first use, so that importing the package (e.g., for the CLI) stays light
+    if name == "MuseStream":
+        from .musestream import MuseStream
+
+        return MuseStream
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
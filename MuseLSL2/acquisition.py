@@ -0,0 +1,162 @@
+import multiprocessing
+import secrets
+import time
+from functools import partial
+
+import numpy as np
+
+from .ringbuffer import SharedRingBuffer
+from .stream import STREAMS, channel_names, make_outlet
+
+
+class Acquisition:
+    """Acquire data from a Muse in a dedicated process.
+
+    The acquisition process owns the BLE backend and the Muse, and writes the decoded frames
+    (and their timestamps) into one shared-memory ring buffer per modality. Any number of
+    consumers (in this or other processes) can read them, attaching to the rings by name
+    (see ``names``), without competing with the BLE callbacks for the GIL.
+
+    Example
+    -------
+    with Acquisition("00:55:DA:B5:E8:CF") as acquisition:
+        ring = SharedRingBuffer(acquisition.names["EEG"])  # In any process
+        data, timestamps, position = ring.copy(0)
+    """
+
+    def __init__(
+        self,
+        address,
+        modalities=("EEG",),
+        preset=None,
+        seconds=60,
+        stall_timeout=5,
+        max_retries=10,
+        channels=None,
+    ):
+        self.address = address
+        self.channels = channels
+        self.preset = preset
+        self.stall_timeout = stall_timeout
+        self.max_retries = max_retries
+        # Short names (macOS limits them to 31 characters)
+        token = secrets.token_hex(4)
+        self.names = {stype: f"muse_{token}_{stype}" for stype in modalities}
+
+        # The rings are created (and destroyed) by the parent process
+        self.rings = {
+            stype: SharedRingBuffer(
+                name,
+                n_channels=len(channel_names(stype, channels)),
+                capacity=int(seconds * STREAMS[stype]["sfreq"]),
+                create=True,
+            )
+            for stype, name in self.names.items()
+        }
+        self._stop = multiprocessing.Event()
+        self.process = None
+
+    def start(self):
+        self.process = multiprocessing.Process(
+            target=_acquire,
+            args=(
+                self.address,
+                self.names,
+                self.preset,
+                self.stall_timeout,
+                self.max_retries,
+                self.channels,
+                self._stop,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.process is not None:
+            self.process.join(timeout=10)
+            if self.process.is_alive():
+                self.process.terminate()
+        for ring in self.rings.values():
+            ring.close()
+            ring.unlink()
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def _acquire(address, names, preset, stall_timeout, max_retries, channels, stop):
+    """Main function of the acquisition process."""
+    from .muse import Muse
+    from .stream import supervise
+
+    rings = {stype: SharedRingBuffer(name) for stype, name in names.items()}
+
+    def write(data, timestamps, ring):
+        ring.write(data.T, np.asarray(timestamps))
+
+    callbacks = {stype: partial(write, ring=ring) for stype, ring in rings.items()}
+
+    muse = Muse(
+        address=address,
+        callback_eeg=callbacks["EEG"],
+        callback_ppg=callbacks.get("PPG"),
+        callback_acc=callbacks.get("ACC"),
+        callback_gyro=callbacks.get("GYRO"),
+        preset=preset,
+        eeg_channels=channels,
+    )
+    muse.connect()
+    print("Connected.")
+    muse.start()
+
+    try:
+        if not supervise(muse, stall_timeout, max_retries=max_retries, stop=stop):
+            print(f"Could not reconnect after {max_retries} attempts. Disconnecting...")
+    except KeyboardInterrupt:
+        pass
+    muse.stop()
+    for ring in rings.values():
+        ring.close()
+
+
+def stream_isolated(
+    address, modalities, preset=None, stall_timeout=5, max_retries=10, channels=None, poll=0.005
+):
+    """Stream to LSL, with the acquisition running in a dedicated process.
+
+    This process only reads the shared-memory rings and pushes the new samples to the outlets.
+    """
+    outlets = {stype: make_outlet(stype, address, channels) for stype in modalities}
+    acquisition = Acquisition(
+        address,
+        modalities,
+        preset,
+        stall_timeout=stall_timeout,
+        max_retries=max_retries,
+        channels=channels,
+    )
+
+    with acquisition:
+        positions = dict.fromkeys(modalities, 0)
+        print(f"Streaming... {', '.join(modalities)}... (CTRL + C to interrupt)")
+        try:
+            while acquisition.is_alive():
+                for stype, ring in acquisition.rings.items():
+                    if ring.count > positions[stype]:
+                        data, timestamps, start = ring.copy(positions[stype])
+                        data = np.ascontiguousarray(data, dtype=np.float32)
+                        outlets[stype].push_chunk(data, timestamps[-1])
+                        positions[stype] = start + len(timestamps)
+                time.sleep(poll)
+        except KeyboardInterrupt:
+            print("Stream interrupted. Stopping...")
+    print("Disconnected.")
@@ -0,0 +1,242 @@
+"""Compact lossless archives of Muse recordings ('.musez').
+
+Samples are stored as the integer codes sent by the device (12-bit EEG, 24-bit PPG, 16-bit
+IMU), delta-encoded along time and compressed (zlib), in chunks. Timestamps are delta-encoded
+on their bit patterns (so that they are restored exactly). Streams whose values are not exactly
+device codes (e.g., filtered data or other devices) are stored as compressed raw values instead.
+
+File layout: magic, chunks, JSON index (streams and chunk offsets), index offset, magic.
+"""
+
+import glob
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from .xdf import load_xdf, write_xdf
+
+_MAGIC = b"MUSEZ001"
+
+# Physical value = scale * (code - offset), as decoded in muse.py
+SCALES = {
+    "EEG": (0.48828125, 2048),
+    "PPG": (1.0, 0),
+    "ACC": (0.0000610352, 0),
+    "GYRO": (0.0074768, 0),
+}
+
+
+def to_codes(stype, values):
+    """Integer codes of the values of a modality, or None if the values are not exact codes."""
+    if stype not in SCALES or values.dtype.kind != "f" or values.size == 0:
+        return None
+    scale, offset = SCALES[stype]
+    codes = np.round(values / scale + offset)
+    if not np.all(np.abs(codes) < 2**31):
+        return None
+    codes = codes.astype(np.int32)
+    if not np.array_equal(from_codes(stype, codes).astype(values.dtype), values):
+        return None
+    return codes
+
+
+def from_codes(stype, codes):
+    """Physical values of integer codes."""
+    scale, offset = SCALES[stype]
+    return scale * (codes - offset).astype(np.float64)
+
+
+def _shuffle(values):
+    """Group the bytes of the values by significance (which compresses better)."""
+    values = np.ascontiguousarray(values)
+    return values.view(np.uint8).reshape(-1, values.dtype.itemsize).T.tobytes()
+
+
+def _unshuffle(content, dtype, shape):
+    dtype = np.dtype(dtype)
+    raw = np.frombuffer(content, dtype=np.uint8).reshape(dtype.itemsize, -1).T
+    return np.ascontiguousarray(raw).view(dtype).reshape(shape)
+
+
+def _encode(values, codes, level):
+    """Encode a chunk of samples, returns (dtype, content)."""
+    if values.dtype.kind == "U":  # Strings (e.g., markers)
+        return "json", zlib.compress(json.dumps(values.tolist()).encode("utf-8"), level)
+    if codes is None:
+        return values.dtype.str, zlib.compress(_shuffle(values), level)
+    # The first sample is stored as is, then the differences with the previous sample
+    deltas = np.diff(codes, axis=0, prepend=np.zeros_like(codes[:1]))
+    dtype = "<i2" if np.abs(deltas).max() < 2**15 else "<i4"
+    return dtype, zlib.compress(_shuffle(deltas.astype(dtype)), level)
+
+
+def write_archive(path, streams, chunk_size=4096, level=6):
+    """Write streams (pyxdf-style dicts, see ``xdf.write_xdf``) to an archive.
+
+    Each stream is split into chunks of ``chunk_size`` samples, compressed with zlib
+    (``level`` 0 to 9). Returns the index of the archive.
+    """
+    index = {"streams": [], "chunks": []}
+    with open(path, "wb") as f:
+        f.write(_MAGIC)
+        for stream_id, stream in enumerate(streams):
+            info = stream["info"]
+            timestamps = np.asarray(stream["time_stamps"], dtype=np.float64)
+            values = stream["time_series"]
+            if isinstance(values, list):
+                n_channels = int(info["channel_count"][0])
+                values = np.array(values, dtype=str).reshape(len(timestamps), n_channels)
+            codes = to_codes(info["type"][0], values)
+            index["streams"].append(
+                {
+                    "info": info,
+                    "kind": "raw" if codes is None else "codes",
+                    "dtype": values.dtype.str,
+                    "n_channels": values.shape[1] if values.ndim > 1 else 1,
+                }
+            )
+
+            for start in range(0, len(timestamps), chunk_size):
+                stop = min(start + chunk_size, len(timestamps))
+                dtype, content = _encode(values[start:stop], None if codes is None else codes[start:stop], level)
+                # Positive float64 are ordered like their bit patterns, as int64
+                times = np.diff(timestamps[start:stop].view(np.int64), prepend=np.int64(0))
+                times = zlib.compress(_shuffle(times), level)
+                index["chunks"].append(
+                    {
+                        "stream": stream_id,
+                        "offset": f.tell(),
+                        "sizes": [len(content), len(times)],
+                        "n_samples": stop - start,
+                        "dtype": dtype,
+                        "first_timestamp": float(timestamps[start]),
+                        "last_timestamp": float(timestamps[stop - 1]),
+                    }
+                )
+                f.write(content)
+                f.write(times)
+
+        index_offset = f.tell()
+        f.write(json.dumps(index).encode("utf-8"))
+        f.write(struct.pack("<Q", index_offset))
+        f.write(_MAGIC)
+    return index
+
+
+def read_index(f):
+    """Read the index of an open archive."""
+    f.seek(0)
+    if f.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError("Not a MuseLSL2 archive.")
+    f.seek(-8 - len(_MAGIC), os.SEEK_END)
+    index_offset = struct.unpack("<Q", f.read(8))[0]
+    end = f.tell()
+    f.seek(index_offset)
+    return json.loads(f.read(end - 8 - index_offset).decode("utf-8"))
+
+
+def read_archive(path, start=None, stop=None, stypes=None):
+    """Read an archive as pyxdf-style streams (physical values, in the original dtype).
+
+    Only the chunks overlapping the ``start`` to ``stop`` range (in timestamps of the
+    recording) of the streams of type ``stypes`` (default: all) are read and decoded.
+    """
+    with open(path, "rb") as f:
+        index = read_index(f)
+        chunks = {i: [] for i in range(len(index["streams"]))}
+        for chunk in index["chunks"]:
+            stream = index["streams"][chunk["stream"]]
+            if stypes is not None and stream["info"]["type"][0] not in stypes:
+                continue
+            if start is not None and chunk["last_timestamp"] < start:
+                continue
+            if stop is not None and chunk["first_timestamp"] > stop:
+                continue
+            f.seek(chunk["offset"])
+            content, times = f.read(chunk["sizes"][0]), f.read(chunk["sizes"][1])
+            chunks[chunk["stream"]].append((chunk, content, times))
+
+    streams = []
+    for stream_id, stream in enumerate(index["streams"]):
+        stype = stream["info"]["type"][0]
+        if stypes is not None and stype not in stypes:
+            continue
+        values, timestamps = _decode(stream, chunks[stream_id])
+        if start is not None or stop is not None:
+            keep = (timestamps >= (-np.inf if start is None else start)) & (
+                timestamps <= (np.inf if stop is None else stop)
+            )
+            values, timestamps = values[keep], timestamps[keep]
+        if values.dtype.kind == "U":
+            values = values.tolist()
+        streams.append({"info": stream["info"], "time_series": values, "time_stamps": timestamps})
+    return streams
+
+
+def _decode(stream, chunks):
+    """Decode the chunks of a stream (all at once, after decompression)."""
+    n_channels = stream["n_channels"]
+    dtype = np.dtype(stream["dtype"])
+    if not chunks:
+        return np.empty((0, n_channels), dtype=dtype), np.empty(0)
+
+    timestamps = np.concatenate(
+        [np.cumsum(_unshuffle(zlib.decompress(times), np.int64, -1)) for _, _, times in chunks]
+    ).view(np.float64)
+    if dtype.kind == "U":
+        values = np.array(
+            [row for _, content, _ in chunks for row in json.loads(zlib.decompress(content))], dtype=dtype
+        ).reshape(-1, n_channels)
+        return values, timestamps
+
+    blocks = [
+        _unshuffle(zlib.decompress(content), chunk["dtype"], (chunk["n_samples"], n_channels))
+        for chunk, content, _ in chunks
+    ]
+    if stream["kind"] == "raw":
+        return np.concatenate(blocks), timestamps
+    codes = np.concatenate([np.cumsum(block, axis=0, dtype=np.int32) for block in blocks])
+    return from_codes(stream["info"]["type"][0], codes).astype(dtype), timestamps
+
+
+def archive_file(path, output=None, chunk_size=4096):
+    """Convert an XDF file to an archive (by default, next to it with a '.musez' extension)."""
+    if output is None:
+        output = os.path.splitext(path)[0] + ".musez"
+    streams, _ = load_xdf(path, dejitter_timestamps=False)
+    index = write_archive(output, streams, chunk_size)
+    kinds = ", ".join(f"{s['info']['type'][0]} ({s['kind']})" for s in index["streams"])
+    ratio = os.path.getsize(path) / os.path.getsize(output)
+    print(f"Written {output} ({ratio:.1f}x smaller): {kinds}")
+    return output
+
+
+def extract_file(path, output=None):
+    """Convert an archive back to XDF (by default, next to it with a '.xdf' extension)."""
+    if output is None:
+        output = os.path.splitext(path)[0] + ".xdf"
+    write_xdf(output, read_archive(path))
+    print(f"Written {output}")
+    return output
+
+
+def archive(pattern, extract=False, output_dir=None):
+    """Archive all XDF files matching ``pattern`` (or extract archives, with ``extract``)."""
+    paths = sorted(glob.glob(pattern, recursive=True))
+    if len(paths) == 0:
+        raise RuntimeError(f"No file matching '{pattern}'.")
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    function, extension = (extract_file, ".xdf") if extract else (archive_file, ".musez")
+    outputs = []
+    for path in paths:
+        output = None
+        if output_dir is not None:
+            name = os.path.splitext(os.path.basename(path))[0] + extension
+            output = os.path.join(output_dir, name)
+        outputs.append(function(path, output))
+    return outputs
@@ -0,0 +1,117 @@
+import mne_lsl.lsl
+import numpy as np
+
+from .stream import STREAMS, channel_names
+
+ARTIFACTS = ["blink", "jaw", "motion"]
+
+
+class ArtifactDetector:
+    """Streaming detection of eye blinks, jaw clenches and head motion.
+
+    Statistics are accumulated frame by frame (in O(new samples)) and, every ``window`` seconds
+    of EEG, a flag (0 or 1) and a confidence (0 to 1, 0.5 at the threshold) per artifact are
+    pushed to the 'ARTIFACT' outlet:
+    "blink" -- peak deviation of the average of AF7 and AF8 from their slow baseline, in µV
+    "jaw" -- RMS of the first difference of the EEG (muscle activity), in µV
+    "motion" -- peak deviation of the acceleration from 1 g, or peak angular velocity,
+                relative to their thresholds
+
+    Use ``add`` as a data callback of the EEG, ACC and GYRO streams, e.g.
+    ``Muse(callback_eeg=partial(detector.add, stype="EEG"), ...)``.
+    """
+
+    def __init__(
+        self,
+        outlet,
+        channels=None,
+        window=0.5,
+        blink_threshold=80,
+        jaw_threshold=30,
+        acc_threshold=0.1,
+        gyro_threshold=20,
+        baseline=1.0,
+    ):
+        self.outlet = outlet
+        self.window = int(window * STREAMS["EEG"]["sfreq"])
+        self.thresholds = np.array([blink_threshold, jaw_threshold, 1.0])
+        self.acc_threshold = acc_threshold
+        self.gyro_threshold = gyro_threshold
+        # Weight of one frame in the running baseline (time constant of ``baseline`` seconds)
+        self.alpha = STREAMS["EEG"]["frame_size"] / (baseline * STREAMS["EEG"]["sfreq"])
+
+        # The AUX channel (usually not connected) is ignored
+        ch_names = channel_names("EEG", channels)
+        self.eeg = [i for i, ch in enumerate(ch_names) if ch != "AUX"]
+        ch_names = [ch_names[i] for i in self.eeg]
+        self.frontal = [ch_names.index(ch) for ch in ["AF7", "AF8"] if ch in ch_names]
+        self._baseline = None
+        self._last = None
+        self._reset()
+
+    def _reset(self):
+        self.n_samples = 0
+        self.values = np.zeros(len(ARTIFACTS))
+        self._sum_squares = 0.0
+        self._n_diffs = 0
+
+    def add(self, data, timestamps, stype):
+        """Callback receiving the frames of EEG, ACC and GYRO, function(data, timestamps, stype)."""
+        if stype == "EEG":
+            self._add_eeg(data, timestamps)
+        elif stype == "ACC":
+            deviation = np.abs(np.sqrt(np.sum(data**2, axis=0)) - 1).max()
+            self.values[2] = max(self.values[2], deviation / self.acc_threshold)
+        elif stype == "GYRO":
+            velocity = np.sqrt(np.sum(data**2, axis=0)).max()
+            self.values[2] = max(self.values[2], velocity / self.gyro_threshold)
+
+    def _add_eeg(self, data, timestamps):
+        data = data[self.eeg]
+        if self._baseline is None:
+            self._baseline = data.mean(axis=1)
+            self._last = data[:, 0]
+
+        # Blinks: large deflections of the frontal channels from their slow baseline
+        if self.frontal:
+            frontal = data[self.frontal] - self._baseline[self.frontal, np.newaxis]
+            self.values[0] = max(self.values[0], np.abs(frontal.mean(axis=0)).max())
+
+        # Jaw clenches: high-frequency (muscle) activity
+        diffs = np.diff(data, axis=1, prepend=self._last[:, np.newaxis])
+        self._sum_squares += np.sum(diffs**2)
+        self._n_diffs += diffs.size
+        self.values[1] = np.sqrt(self._sum_squares / self._n_diffs)
+
+        self._baseline += self.alpha * (data.mean(axis=1) - self._baseline)
+        self._last = data[:, -1]
+
+        self.n_samples += data.shape[1]
+        if self.n_samples >= self.window:
+            self._publish(timestamps[-1])
+
+    def _publish(self, timestamp):
+        ratio = self.values / self.thresholds
+        flags = (ratio > 1).astype(np.float32)
+        confidence = np.clip(ratio / 2, 0, 1)
+        if not self.frontal:
+            flags[0] = confidence[0] = np.nan
+        sample = np.column_stack([flags, confidence]).ravel().astype(np.float32)
+        self.outlet.push_sample(sample, timestamp)
+        self._reset()
+
+
+def make_artifact_outlet(address, window=0.5):
+    """Create the 'ARTIFACT' outlet (flag and confidence of each artifact, per window)."""
+    ch_names = [f"{artifact}_{value}" for artifact in ARTIFACTS for value in ["flag", "confidence"]]
+    info = mne_lsl.lsl.StreamInfo(
+        "Muse",
+        stype="ARTIFACT",
+        n_channels=len(ch_names),
+        sfreq=1 / window,
+        dtype="float32",
+        source_id=f"Muse_{address}_artifacts",
+    )
+    info.desc.append_child_value("manufacturer", "Muse")
+    info.set_channel_names(ch_names)
+    return mne_lsl.lsl.StreamOutlet(info)
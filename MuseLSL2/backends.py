@@ -1,8 +1,11 @@
 import asyncio
 import atexit
+import threading
 import time
 
 import bleak
+import mne_lsl.lsl
+import numpy as np
 
 
 def _wait(coroutine):
@@ -80,3 +83,212 @@ class BleakDevice:
             callback(value_handle, data)
 
         _wait(self._client.start_notify(uuid, wrap))
+
+    def unsubscribe(self, uuid):
+        # Disabling the notifications stops the device from sending them
+        _wait(self._client.stop_notify(uuid))
+
+
+class SyntheticBackend:
+    """Backend emulating a Muse without any Bluetooth hardware.
+
+    Packets are generated at the nominal rate of each characteristic (times ``speed``), when
+    the device is streaming (after the 'd' command) and the backend is ``running``. They are
+    either synthetic signals or replayed from the EEG, PPG, ACC and GYRO streams of an XDF
+    file (``source``, looped). Notifications are delivered while the backend is pumped (i.e.,
+    in ``sleep()``), in the thread of the caller.
+
+    With ``record=True``, the (local_clock) time of the last notification of each frame is
+    stored in ``device.notifications[stype]``. Each notification is dropped with probability
+    ``loss`` (which can be changed while streaming, e.g., to emulate congestion).
+    """
+
+    def __init__(self, speed=1.0, source=None, autostart=True, record=False, resolution=0.001, loss=0.0):
+        self.connected = set()
+        self.speed = speed
+        self.frames = _synthetic_frames(source)
+        self.running = threading.Event()
+        if autostart:
+            self.running.set()
+        self.record = record
+        self.resolution = resolution
+        self.loss = loss
+        self.rng = np.random.default_rng(0)
+        self.device = None
+        global sleep
+        sleep = self.pump
+
+    def start(self):
+        pass
+
+    def pump(self, seconds=1):
+        deadline = time.perf_counter() + seconds
+        while True:
+            now = time.perf_counter()
+            if self.running.is_set():
+                for device in [*self.connected]:
+                    device.emit(now)
+            if now >= deadline:
+                return
+            time.sleep(min(self.resolution, deadline - now))
+
+    def stop(self):
+        for device in [*self.connected]:
+            device.disconnect()
+
+    def scan(self, timeout=10):
+        return [{"name": "Muse-Synthetic", "address": "00:00:00:00:00:00"}]
+
+    def connect(self, address):
+        self.device = SyntheticDevice(self, address)
+        self.device.connect()
+        return self.device
+
+
+class SyntheticDevice:
+    def __init__(self, adapter, address):
+        from .muse import (
+            ATTR_ACCELEROMETER,
+            ATTR_GYRO,
+            ATTR_PPG1,
+            ATTR_PPG2,
+            ATTR_PPG3,
+            EEG_CHANNELS,
+        )
+
+        self._adapter = adapter
+        self.address = address
+        # Characteristic -> (modality, row of the frame, value handle)
+        self._characteristics = {
+            uuid: ("EEG", row, handle) for row, (uuid, handle) in enumerate(EEG_CHANNELS.values())
+        }
+        self._characteristics[ATTR_PPG1] = ("PPG", 0, 56)
+        self._characteristics[ATTR_PPG2] = ("PPG", 1, 59)
+        self._characteristics[ATTR_PPG3] = ("PPG", 2, 62)
+        self._characteristics[ATTR_ACCELEROMETER] = ("ACC", 0, 23)
+        self._characteristics[ATTR_GYRO] = ("GYRO", 0, 20)
+        self._callbacks = {}  # modality -> [(row, handle, callback)], in order of arrival
+        self.streaming = False
+        self.notifications = {stype: [] for stype in _FRAMES}
+        self._next = {}
+        self._index = dict.fromkeys(_FRAMES, 0)
+
+    def connect(self):
+        self._adapter.connected.add(self)
+
+    def disconnect(self):
+        self.streaming = False
+        self._adapter.connected.discard(self)
+
+    def char_write_handle(self, value_handle, value, wait_for_response=True, timeout=30):
+        command = bytes(value[1 : value[0]]).decode("utf-8", errors="replace")
+        if command == "d":
+            self.streaming = True
+            self._next = {}
+        elif command == "h":
+            self.streaming = False
+
+    def subscribe(self, uuid, callback=None, indication=False, wait_for_response=True):
+        if uuid not in self._characteristics:
+            return
+        stype, row, handle = self._characteristics[uuid]
+        self._callbacks.setdefault(stype, []).append((row, handle, callback))
+        self._callbacks[stype].sort(key=lambda item: _ARRIVAL_ORDER.index(item[1]))
+
+    def unsubscribe(self, uuid):
+        if uuid not in self._characteristics:
+            return
+        stype, _, handle = self._characteristics[uuid]
+        callbacks = [item for item in self._callbacks.get(stype, []) if item[1] != handle]
+        if callbacks:
+            self._callbacks[stype] = callbacks
+        else:
+            self._callbacks.pop(stype, None)
+            self._next.pop(stype, None)
+
+    def emit(self, now):
+        """Deliver the notifications that are due at ``now`` (perf_counter)."""
+        if not self.streaming:
+            return
+        for stype, callbacks in self._callbacks.items():
+            size, sfreq = _FRAMES[stype]
+            period = size / sfreq / self._adapter.speed
+            due = self._next.setdefault(stype, now)
+            while due <= now:
+                frames = self._adapter.frames[stype]
+                index = self._index[stype]
+                frame = frames[index % len(frames)]
+                counter = (index & 0xFFFF).to_bytes(2, "big")
+                for i, (row, handle, callback) in enumerate(callbacks):
+                    if self._adapter.record and i == len(callbacks) - 1:
+                        self.notifications[stype].append(mne_lsl.lsl.local_clock())
+                    if self._adapter.loss and self._adapter.rng.random() < self._adapter.loss:
+                        continue
+                    callback(handle, counter + frame[row])
+                self._index[stype] = index + 1
+                due += period
+            self._next[stype] = due
+
+
+# Samples per frame (one notification per characteristic) and sampling rate of each modality
+_FRAMES = {"EEG": (12, 256), "PPG": (6, 64), "ACC": (3, 52), "GYRO": (3, 52)}
+
+# Value handles in the order in which the notifications of a frame arrive
+_ARRIVAL_ORDER = [44, 41, 38, 32, 35, 56, 59, 62, 23, 20]
+
+
+def _synthetic_frames(source=None, seconds=10):
+    """Payloads (without the packet index) of the frames of each modality.
+
+    Returns {modality: list of frames}, each frame being a list of payloads (one per row).
+    """
+    rng = np.random.default_rng(42)
+    signals = {}
+    for stype, (size, sfreq) in _FRAMES.items():
+        t = np.arange(int(seconds * sfreq) // size * size) / sfreq
+        if stype == "EEG":  # 10 Hz alpha + noise, in µV
+            signals[stype] = 20 * np.sin(2 * np.pi * 10 * t) + rng.normal(0, 5, (5, len(t)))
+        elif stype == "PPG":  # Pulse at 70 bpm
+            pulse = 5000 * np.sin(2 * np.pi * 70 / 60 * t)
+            signals[stype] = 50000 + pulse + rng.normal(0, 100, (3, len(t)))
+        elif stype == "ACC":  # Head upright, in g
+            signals[stype] = np.array([[0.0], [0.0], [1.0]]) + rng.normal(0, 0.01, (3, len(t)))
+        else:  # In degrees per second
+            signals[stype] = rng.normal(0, 1, (3, len(t)))
+
+    if source is not None:
+        from .xdf import load_xdf
+
+        streams, _ = load_xdf(source, dejitter_timestamps=False)
+        for stream in streams:
+            stype = stream["info"]["type"][0]
+            data = np.asarray(stream["time_series"], dtype=np.float64)
+            if stype in signals and len(data) >= 12:
+                signals[stype] = data.T
+
+    return {stype: _encode(stype, data) for stype, data in signals.items()}
+
+
+def _encode(stype, data):
+    """Encode signals (n_channels, n_samples) into the payloads of the Muse packets."""
+    if stype == "EEG":
+        codes = np.clip(np.round(data / 0.48828125 + 2048), 0, 4095).astype(np.uint32)
+        codes = codes[:, : codes.shape[1] // 12 * 12].reshape(len(codes), -1, 12)
+        # Two 12-bit samples in three bytes
+        a, b = codes[..., 0::2], codes[..., 1::2]
+        packed = np.stack([a >> 4, ((a & 0xF) << 4) | (b >> 8), b & 0xFF], axis=-1).astype(np.uint8)
+        packed = packed.reshape(len(codes), codes.shape[1], 18)
+        return [[packed[row, i].tobytes() for row in range(len(codes))] for i in range(codes.shape[1])]
+
+    if stype == "PPG":
+        codes = np.clip(np.round(data), 0, 2**24 - 1).astype(np.uint32)
+        codes = codes[:, : codes.shape[1] // 6 * 6].reshape(len(codes), -1, 6)
+        packed = np.stack([codes >> 16, (codes >> 8) & 0xFF, codes & 0xFF], axis=-1).astype(np.uint8)
+        packed = packed.reshape(len(codes), codes.shape[1], 18)
+        return [[packed[row, i].tobytes() for row in range(len(codes))] for i in range(codes.shape[1])]
+
+    # IMU: 3 samples of (x, y, z) as signed 16-bit integers
+    scale = 0.0000610352 if stype == "ACC" else 0.0074768
+    codes = np.clip(np.round(data / scale), -(2**15), 2**15 - 1).astype(">i2")
+    codes = codes[:, : codes.shape[1] // 3 * 3]
+    return [[codes[:, 3 * i : 3 * i + 3].T.tobytes()] for i in range(codes.shape[1] // 3)]
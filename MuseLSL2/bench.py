@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+
+import mne_lsl.lsl
+import numpy as np
+
+from .backends import SyntheticBackend
+from .stream import STREAMS, stream
+
+# Outlet profiles: keyword arguments of stream()
+PROFILES = {
+    "default": {},
+    "merged": {"merged": True},
+    "artifacts": {"artifacts": True},
+    "diagnostics": {"diagnostics": True},
+}
+
+
+class _Reader:
+    """Pull an inlet in a thread, recording the arrival time of each frame."""
+
+    def __init__(self, inlet, frame_size, notifications):
+        self.inlet = inlet
+        self.frame_size = frame_size
+        self.notifications = notifications
+        self.n_samples = 0
+        self.latencies = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            _, timestamps = self.inlet.pull_chunk(timeout=0.05, max_samples=self.frame_size)
+            if len(timestamps) == 0:
+                continue
+            now = mne_lsl.lsl.local_clock()
+            done = self.n_samples // self.frame_size
+            self.n_samples += len(timestamps)
+            # Frames are delivered in order: the k-th frame is the k-th notification
+            for k in range(done, self.n_samples // self.frame_size):
+                self.latencies.append(now - self.notifications[k])
+
+
+def _thread_time(thread):
+    """CPU time of another thread (NaN where it can't be measured, e.g., on Windows)."""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except (AttributeError, OSError):
+        return np.nan
+
+
+def run_profile(profile="default", duration=10, speed=1.0, source=None, preset="p50", timeout=5):
+    """Stream from a synthetic device for ``duration`` seconds, reading the outlets locally.
+
+    Returns {stype: {samples, dropped, throughput, p50, p95, p99, max}} (latencies in seconds,
+    from the last BLE notification of a frame to its arrival in the inlet) and the CPU use (in
+    % of one core) of the streaming thread and of the whole process. Everything is measured
+    from the start of the device to the end of the stream, excluding the setup and shutdown.
+    """
+    address = f"bench-{os.getpid()}-{profile}"
+    backend = SyntheticBackend(speed, source, autostart=False, record=True)
+    kwargs = PROFILES[profile]
+
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=stream, args=(address,), kwargs=dict(preset=preset, backend=backend, stop=stop, **kwargs)
+    )
+    thread.daemon = True
+    thread.start()
+
+    # Connect the inlets before the device starts sending packets
+    deadline = time.perf_counter() + timeout
+    while backend.device is None or not backend.device.streaming:
+        if time.perf_counter() > deadline or not thread.is_alive():
+            raise RuntimeError("The synthetic device did not start streaming.")
+        time.sleep(0.01)
+
+    stypes = ["EEG", "PPG", "ACC", "GYRO"] + (["MERGED"] if kwargs.get("merged") else [])
+    infos = mne_lsl.lsl.resolve_streams(timeout, source_id=f"Muse_{address}", minimum=len(stypes))
+    infos = {info.stype: info for info in infos}
+    readers = {}
+    for stype in stypes:
+        if stype not in infos:
+            raise RuntimeError(f"Can't find the {stype} stream of the benchmark.")
+        inlet = mne_lsl.lsl.StreamInlet(infos[stype])
+        inlet.open_stream()
+        spec = STREAMS.get(stype, STREAMS["EEG"])  # MERGED is on the EEG timebase
+        notifications = backend.device.notifications["EEG" if stype == "MERGED" else stype]
+        readers[stype] = _Reader(inlet, spec["frame_size"], notifications)
+
+    start, process_start, thread_start = time.perf_counter(), time.process_time(), _thread_time(thread)
+    backend.running.set()
+    time.sleep(duration)
+    backend.running.clear()  # No packet after the measurement
+    stop.set()
+    elapsed = time.perf_counter() - start
+    cpu = {
+        "thread": _thread_time(thread) - thread_start,
+        "process": time.process_time() - process_start,
+    }
+    thread.join()
+    time.sleep(0.5)  # Let the last samples arrive
+
+    results = {}
+    for stype, reader in readers.items():
+        reader.stop()
+        spec = STREAMS.get(stype, STREAMS["EEG"])
+        expected = len(reader.notifications) * spec["frame_size"]
+        latencies = np.array(reader.latencies)
+        results[stype] = {
+            "samples": reader.n_samples,
+            "dropped": expected - reader.n_samples,
+            "throughput": reader.n_samples / elapsed,
+        }
+        for q in [50, 95, 99]:
+            results[stype][f"p{q}"] = np.percentile(latencies, q) if len(latencies) else np.nan
+        results[stype]["max"] = latencies.max() if len(latencies) else np.nan
+
+    cpu = {key: 100 * value / elapsed for key, value in cpu.items()}
+    return results, cpu
+
+
+def bench(profiles=("default",), duration=10, speed=1.0, source=None):
+    """Run the end-to-end benchmark for each profile and print the results."""
+    print(f"{'Profile':<12}{'Stream':<8}{'Samples':>9}{'Dropped':>9}{'Rate (Hz)':>11}", end="")
+    print(f"{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'max (ms)':>10}")
+    all_results = {}
+    for profile in profiles:
+        results, cpu = run_profile(profile, duration, speed, source)
+        for stype, r in results.items():
+            print(f"{profile:<12}{stype:<8}{r['samples']:>9}{r['dropped']:>9}", end="")
+            print(f"{r['throughput']:>11.1f}", end="")
+            print("".join(f"{1000 * r[key]:>10.2f}" for key in ["p50", "p95", "p99", "max"]))
+        print(f"{profile:<12}CPU: {cpu['thread']:.1f}% (streaming thread), {cpu['process']:.1f}% (process)")
+        all_results[profile] = {"streams": results, "cpu": cpu}
+    return all_results
@@ -51,13 +51,430 @@ class CLI:
             type=str,
             help="Select preset which dictates data channels to be streamed. Default is p50, but can also be 'none'",
         )
+        parser.add_argument(
+            "-d",
+            "--diagnostics",
+            default=False,
+            action="store_true",
+            help="Record the latency of the handlers and publish it on a 'DIAGNOSTICS' stream",
+        )
+        parser.add_argument(
+            "-t",
+            "--stall-timeout",
+            dest="stall_timeout",
+            default=5,
+            type=float,
+            help="Reconnect if no data is received for this many seconds. Default is 5.",
+        )
+        parser.add_argument(
+            "-r",
+            "--retries",
+            dest="max_retries",
+            default=10,
+            type=int,
+            help="Number of reconnection attempts before giving up. Default is 10.",
+        )
+        parser.add_argument(
+            "-i",
+            "--isolated",
+            default=False,
+            action="store_true",
+            help="Run the acquisition in a dedicated process, sharing the data through shared memory",
+        )
+        parser.add_argument(
+            "-m",
+            "--merged",
+            default=False,
+            action="store_true",
+            help="Also stream all channels, resampled on the EEG timebase, on a single 'MERGED' stream",
+        )
+
+        parser.add_argument(
+            "-e",
+            "--channels",
+            default=None,
+            type=str,
+            help="Comma-separated EEG channels to stream (e.g. 'TP9,AF7,AF8,TP10'). Default is all.",
+        )
+
+        parser.add_argument(
+            "-A",
+            "--artifacts",
+            default=False,
+            action="store_true",
+            help="Detect blinks, jaw clenches and head motion, and publish them on an 'ARTIFACT' stream",
+        )
+
+        parser.add_argument(
+            "-S",
+            "--status",
+            default=False,
+            action="store_true",
+            help="Poll the battery and telemetry of the device, and publish them on a 'STATUS' stream",
+        )
+
+        parser.add_argument(
+            "--decimate",
+            default=None,
+            type=str,
+            help="Also publish decimated streams, as comma-separated modality:factor (e.g. 'EEG:4,ACC:5').",
+        )
+
+        parser.add_argument(
+            "--flight",
+            default=None,
+            type=str,
+            help="Directory where the last minutes of data are kept, in memory-mapped files (see 'dump').",
+        )
+
+        parser.add_argument(
+            "--flight-minutes",
+            default=10,
+            type=float,
+            help="Duration kept by the flight recorder (in minutes). Default is 10.",
+        )
+
+        parser.add_argument(
+            "--shed",
+            default=False,
+            action="store_true",
+            help="Under sustained packet loss, stop the gyroscope, then the accelerometer, then PPG, to protect EEG (restored when the link recovers).",
+        )
+
+        parser.add_argument(
+            "--soak",
+            default=None,
+            type=str,
+            help="Sample the memory, GC pauses, allocations and handler rates to this JSON-lines file, with a summary at exit.",
+        )
+
+        parser.add_argument(
+            "--soak-interval",
+            default=60,
+            type=float,
+            help="Seconds between two soak samples. Default is 60.",
+        )
+
+        parser.add_argument(
+            "--soak-top",
+            default=10,
+            type=int,
+            help="Number of source lines whose allocations grew most, in the soak file. Default is 10 (0 disables the allocation tracing, which slows down streaming).",
+        )
+
+        parser.add_argument(
+            "--synthetic",
+            default=None,
+            type=float,
+            metavar="SPEED",
+            help="Stream from a synthetic device (no Bluetooth needed), SPEED times faster than real time (e.g. 60 for an hour per minute).",
+        )
+
+        parser.add_argument(
+            "--source",
+            default=None,
+            type=str,
+            help="With --synthetic, XDF file whose EEG, PPG, ACC and GYRO streams are replayed (default: synthetic signals).",
+        )
+
+        parser.add_argument(
+            "--duration",
+            default=None,
+            type=float,
+            help="Stop after this many seconds. Default is to stream until interrupted.",
+        )
 
         args = parser.parse_args(sys.argv[2:])
-        from .stream import stream
+        from .stream import STREAMS, stream
+
+        backend = None
+        if args.synthetic is not None:
+            from .backends import SyntheticBackend
+
+            backend = SyntheticBackend(args.synthetic, args.source)
+            if args.address is None:
+                args.address = "synthetic"
+
+        channels = None if args.channels is None else args.channels.split(",")
+        decimate = None
+        if args.decimate is not None:
+            decimate = {}
+            for item in args.decimate.split(","):
+                stype, _, factor = item.partition(":")
+                if stype not in STREAMS or not factor.isdigit() or int(factor) < 2:
+                    parser.error(
+                        f"invalid --decimate item '{item}' (expected MODALITY:FACTOR, with a modality "
+                        f"among {', '.join(STREAMS)} and an integer factor of at least 2)"
+                    )
+                decimate[stype] = int(factor)
 
-        stream(args.address, args.ppg, args.acc, args.gyro, args.preset)
+        stream(
+            args.address,
+            args.ppg,
+            args.acc,
+            args.gyro,
+            args.preset,
+            args.diagnostics,
+            stall_timeout=args.stall_timeout,
+            max_retries=args.max_retries,
+            isolated=args.isolated,
+            merged=args.merged,
+            channels=channels,
+            artifacts=args.artifacts,
+            status=args.status,
+            decimate=decimate,
+            flight=args.flight,
+            flight_minutes=args.flight_minutes,
+            load_shedding=args.shed,
+            backend=backend,
+            duration=args.duration,
+            soak=args.soak,
+            soak_interval=args.soak_interval,
+            soak_top=args.soak_top,
+        )
 
     def view(self):
+        parser = argparse.ArgumentParser(description="Show the Muse streams of the network.")
+        parser.add_argument(
+            "--fps",
+            type=float,
+            default=30,
+            help="Frame rate of the display. Default is 30.",
+        )
+        parser.add_argument(
+            "--catch-up",
+            type=float,
+            default=1.0,
+            help="Drop the data waiting for more than this many seconds, to stay in real time (0 to never drop). Default is 1.",
+        )
+
+        args = parser.parse_args(sys.argv[2:])
         from .view import view
 
-        view()
+        view(args.fps, args.catch_up or None)
+
+    def bench(self):
+        parser = argparse.ArgumentParser(
+            description="Measure the end-to-end latency of the streams, using a synthetic device (no Bluetooth needed)."
+        )
+        parser.add_argument(
+            "--profiles",
+            type=str,
+            default="default",
+            help="Comma-separated outlet profiles, among 'default', 'merged', 'artifacts' and 'diagnostics'.",
+        )
+        parser.add_argument(
+            "-d",
+            "--duration",
+            type=float,
+            default=10,
+            help="Duration of each run (in seconds). Default is 10.",
+        )
+        parser.add_argument(
+            "-s",
+            "--speed",
+            type=float,
+            default=1.0,
+            help="Rate of the packets, relative to the nominal rates of the device. Default is 1.",
+        )
+        parser.add_argument(
+            "--source",
+            type=str,
+            default=None,
+            help="XDF file whose EEG, PPG, ACC and GYRO streams are replayed (default: synthetic signals).",
+        )
+
+        args = parser.parse_args(sys.argv[2:])
+        from .bench import bench
+
+        bench(args.profiles.split(","), args.duration, args.speed, args.source)
+
+    def erp(self):
+        parser = argparse.ArgumentParser(
+            description="Average the EEG around the markers of an LSL stream, per condition, in real-time."
+        )
+        parser.add_argument(
+            "--tmin", type=float, default=-0.2, help="Start of the epochs (in seconds). Default is -0.2."
+        )
+        parser.add_argument(
+            "--tmax", type=float, default=0.8, help="End of the epochs (in seconds). Default is 0.8."
+        )
+        parser.add_argument(
+            "-m",
+            "--markers",
+            dest="marker_stype",
+            type=str,
+            default="Markers",
+            help="Type of the marker stream. Default is 'Markers'.",
+        )
+        parser.add_argument(
+            "--no-baseline",
+            dest="baseline",
+            default=True,
+            action="store_false",
+            help="Disable the baseline correction (from tmin to 0).",
+        )
+
+        args = parser.parse_args(sys.argv[2:])
+        from .erp import ERP
+
+        erp = ERP(
+            args.tmin,
+            args.tmax,
+            baseline=(None, 0) if args.baseline else None,
+            marker_stype=args.marker_stype,
+        )
+        erp.run()
+
+    def qc(self):
+        parser = argparse.ArgumentParser(
+            description="Quality control of recorded XDF sessions (sampling rate, gaps, jitter, bad channels)."
+        )
+        parser.add_argument(
+            "pattern",
+            nargs="?",
+            default="data/sub-*/ses-*/eeg/*.xdf",
+            help="Glob pattern of the XDF files. Default is 'data/sub-*/ses-*/eeg/*.xdf'.",
+        )
+        parser.add_argument(
+            "-o",
+            "--report",
+            type=str,
+            default="qc_report.html",
+            help="Path of the HTML report. Default is 'qc_report.html'.",
+        )
+        parser.add_argument(
+            "--cache",
+            type=str,
+            default=".qc_cache.json",
+            help="Cache of the results (by file hash), so that only new files are processed.",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            dest="n_jobs",
+            type=int,
+            default=None,
+            help="Number of files processed in parallel. Default is the number of CPUs.",
+        )
+
+        args = parser.parse_args(sys.argv[2:])
+        from .qc import qc
+
+        qc(args.pattern, args.report, args.cache, args.n_jobs)
+
+    def dejitter(self):
+        parser = argparse.ArgumentParser(
+            description="Re-timestamp recorded XDF sessions, fitting the clock drift of each stream."
+        )
+        parser.add_argument("files", nargs="+", help="XDF files to process.")
+        parser.add_argument(
+            "-o",
+            "--output",
+            dest="output_dir",
+            type=str,
+            default=None,
+            help="Output directory. By default, files are written next to the input with a '_dejittered' suffix.",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            dest="n_jobs",
+            type=int,
+            default=None,
+            help="Number of files processed in parallel. Default is the number of CPUs.",
+        )
+
+        args = parser.parse_args(sys.argv[2:])
+        from .dejitter import dejitter_files
+
+        dejitter_files(args.files, args.output_dir, args.n_jobs)
+
+    def replay(self):
+        parser = argparse.ArgumentParser(
+            description="Replay recorded XDF sessions as live Muse LSL streams (e.g., to load-test clients)."
+        )
+        parser.add_argument("files", nargs="+", help="XDF files to replay (all at once).")
+        parser.add_argument(
+            "-s",
+            "--speed",
+            type=float,
+            default=1.0,
+            help="Replay speed, relative to the recording (0 for as fast as possible). Default is 1.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Restart the sessions from the beginning when they end.",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            dest="n_jobs",
+            type=int,
+            default=None,
+            help="Number of files loaded in parallel. Default is the number of CPUs.",
+        )
+
+        args = parser.parse_args(sys.argv[2:])
+        from .replay import replay
+
+        replay(args.files, args.speed, args.loop, n_jobs=args.n_jobs)
+
+    def dump(self):
+        parser = argparse.ArgumentParser(
+            description="Export data kept by the flight recorder ('stream --flight') to XDF or NumPy."
+        )
+        parser.add_argument(
+            "directory", nargs="?", default="flight", help="Flight recorder directory. Default is 'flight'."
+        )
+        parser.add_argument(
+            "-o",
+            "--output",
+            type=str,
+            default="flight.xdf",
+            help="Output file (.xdf, .npz for NumPy arrays, or .musez archive). Default is 'flight.xdf'.",
+        )
+        parser.add_argument(
+            "--last",
+            type=float,
+            default=None,
+            help="Only export the last seconds of data. Default is everything.",
+        )
+        parser.add_argument("--start", type=float, default=None, help="Start of the range (LSL timestamp).")
+        parser.add_argument("--stop", type=float, default=None, help="End of the range (LSL timestamp).")
+
+        args = parser.parse_args(sys.argv[2:])
+        from .flight import dump
+
+        print(f"Written {dump(args.directory, args.output, args.start, args.stop, args.last)}")
+
+    def archive(self):
+        parser = argparse.ArgumentParser(
+            description="Losslessly compress XDF recordings into '.musez' archives (or extract them back to XDF)."
+        )
+        parser.add_argument(
+            "pattern",
+            nargs="?",
+            default="data/sub-*/ses-*/eeg/*.xdf",
+            help="Glob pattern of the files. Default is 'data/sub-*/ses-*/eeg/*.xdf'.",
+        )
+        parser.add_argument(
+            "-x",
+            "--extract",
+            action="store_true",
+            help="Convert '.musez' archives back to XDF.",
+        )
+        parser.add_argument(
+            "-o",
+            "--output",
+            dest="output_dir",
+            type=str,
+            default=None,
+            help="Output directory. By default, files are written next to the input.",
+        )
+
+        args = parser.parse_args(sys.argv[2:])
+        from .archive import archive
+
+        archive(args.pattern, args.extract, args.output_dir)
@@ -0,0 +1,91 @@
+import mne_lsl.lsl
+import numpy as np
+
+from .stream import STREAMS, channel_names
+
+
+def _check_factor(factor):
+    if isinstance(factor, bool) or not isinstance(factor, (int, np.integer)) or factor < 2:
+        raise ValueError(f"The decimation factor must be an integer of at least 2 (got {factor!r}).")
+
+
+def lowpass_taps(factor, n_taps=None):
+    """Anti-aliasing FIR filter for decimation by ``factor`` (Hamming-windowed sinc).
+
+    The cutoff is at 80% of the output Nyquist frequency. By default, the filter has
+    ``16 * factor + 1`` taps (linear phase, delay of ``8 * factor`` input samples).
+    """
+    if n_taps is None:
+        n_taps = 16 * factor + 1
+    cutoff = 0.8 / factor  # Relative to the input Nyquist frequency
+    n = np.arange(n_taps) - (n_taps - 1) / 2
+    taps = cutoff * np.sinc(cutoff * n) * np.hamming(n_taps)
+    return taps / taps.sum()
+
+
+class Decimator:
+    """Stateful decimation of a modality, pushed to an outlet (see ``make_decimated_outlet``).
+
+    Use it as a data callback, function(data, timestamps). The FIR filter is applied frame by
+    frame, keeping the last input samples between frames, and only one output sample every
+    ``factor`` input samples is computed (polyphase). Output timestamps are those of the
+    corresponding input samples, shifted by the delay of the filter.
+    """
+
+    def __init__(self, outlet, factor, sfreq, taps=None):
+        _check_factor(factor)
+        self.outlet = outlet
+        self.factor = factor
+        self.taps = lowpass_taps(factor) if taps is None else np.asarray(taps, dtype=np.float64)
+        self.delay = (len(self.taps) - 1) / 2 / sfreq
+        self._history = None
+        self._phase = 0  # Index of the next output sample in the next frame
+
+    def __call__(self, data, timestamps):
+        data = np.asarray(data, dtype=np.float64)
+        if self._history is None:
+            # Start as if the first sample had been constant before the stream
+            self._history = np.repeat(data[:, :1], len(self.taps) - 1, axis=1)
+
+        signal = np.concatenate([self._history, data], axis=1)
+        self._history = signal[:, -(len(self.taps) - 1) :]
+        n_samples = data.shape[1]
+        outputs = np.arange(self._phase, n_samples, self.factor)
+        self._phase = (self._phase - n_samples) % self.factor
+        if len(outputs) == 0:
+            return
+
+        # Windows ending at the output samples (n_channels, n_outputs, n_taps)
+        windows = np.lib.stride_tricks.sliding_window_view(signal, len(self.taps), axis=1)[:, outputs]
+        samples = windows @ self.taps[::-1]
+        timestamp = timestamps[outputs[-1]] - self.delay
+        if len(outputs) == 1:
+            self.outlet.push_sample(samples[:, 0].astype(np.float32), timestamp)
+        else:
+            self.outlet.push_chunk(np.ascontiguousarray(samples.T, dtype=np.float32), timestamp)
+
+
+def make_decimated_outlet(stype, address, factor, channels=None):
+    """Create the outlet of a modality decimated by ``factor`` (named 'MuseDecimated').
+
+    It has the same type and channels as the full-rate outlet of the modality, and a
+    ``source_id`` of 'Muse_{address}_{sfreq}Hz'.
+    """
+    _check_factor(factor)
+    spec = STREAMS[stype]
+    ch_names = channel_names(stype, channels)
+    sfreq = spec["sfreq"] / factor
+    info = mne_lsl.lsl.StreamInfo(
+        "MuseDecimated",
+        stype=stype,
+        n_channels=len(ch_names),
+        sfreq=sfreq,
+        dtype="float32",
+        source_id=f"Muse_{address}_{sfreq:g}Hz",
+    )
+    info.desc.append_child_value("manufacturer", "Muse")
+    info.desc.append_child_value("decimation", str(factor))
+    info.set_channel_names(ch_names)
+    info.set_channel_types([spec["ch_type"]] * len(ch_names))
+    info.set_channel_units(spec["units"])
+    return mne_lsl.lsl.StreamOutlet(info)
@@ -0,0 +1,126 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .stream import STREAMS
+from .xdf import load_xdf, write_xdf
+
+
+def sample_indices(timestamps, sfreq, frame_size=1):
+    """Estimate the index of each sample, accounting for lost samples.
+
+    Runs of identical timestamps (e.g., IMU samples stamped per packet) are treated as one
+    packet whose timestamp is that of its last sample. Samples are lost by whole BLE packets of
+    ``frame_size`` samples, so a gap is only counted when a packet is late by more than 2/3 of a
+    packet (late packets are common, as BLE notifications tend to arrive in bursts). Returns the
+    sample indices and a mask of the samples whose timestamps are informative (the last one of
+    each packet).
+    """
+    timestamps = np.asarray(timestamps)
+    last = np.append(np.diff(timestamps) != 0, True)  # Last sample of each packet
+    ends = np.flatnonzero(last)
+    sizes = np.diff(ends, prepend=-1)
+
+    # Number of samples between the end of two consecutive packets
+    lost = np.floor((np.diff(timestamps[ends]) * sfreq - sizes[1:]) / frame_size + 1 / 3) * frame_size
+    steps = sizes[1:] + np.maximum(lost, 0).astype(np.int64)
+    packet_ends = np.concatenate([[sizes[0] - 1], sizes[0] - 1 + np.cumsum(steps)])
+
+    # Index of each sample, counting backwards from the end of its packet
+    position = np.arange(len(timestamps)) - np.repeat(ends - sizes + 1, sizes)
+    idxs = np.repeat(packet_ends - sizes + 1, sizes) + position
+    return idxs, last
+
+
+def fit_clock(timestamps, sfreq, frame_size=1, outlier_threshold=3):
+    """Fit timestamps = offset + period * index, in one least-squares regression.
+
+    Samples with residuals larger than ``outlier_threshold`` times the median absolute
+    deviation are excluded and the fit is repeated once. Returns the sample indices, the offset
+    and the period.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    idxs, mask = sample_indices(timestamps, sfreq, frame_size)
+    x, y = idxs[mask].astype(np.float64), timestamps[mask] - timestamps[0]
+
+    period, offset = _linear_fit(x, y)
+    residuals = y - (offset + period * x)
+    mad = np.median(np.abs(residuals - np.median(residuals)))
+    keep = np.abs(residuals) <= outlier_threshold * 1.4826 * mad
+    if mad > 0 and 2 <= keep.sum() < len(x):
+        period, offset = _linear_fit(x[keep], y[keep])
+
+    return idxs, timestamps[0] + offset, period
+
+
+def _linear_fit(x, y):
+    x_mean, y_mean = x.mean(), y.mean()
+    period = np.sum((x - x_mean) * (y - y_mean)) / np.sum((x - x_mean) ** 2)
+    return period, y_mean - period * x_mean
+
+
+def _is_regular(timestamps, sfreq):
+    """Whether timestamps were generated from a fixed sampling rate (no jitter at all)."""
+    steps = np.diff(timestamps)
+    steps = steps[steps < 1.5 / sfreq]
+    return len(steps) > 0 and np.all(np.abs(steps - 1 / sfreq) < 1e-6 / sfreq)
+
+
+def dejitter_streams(streams):
+    """Replace the timestamps of the (regularly sampled) streams by a linear fit.
+
+    Streams whose timestamps were generated at a fixed rate (e.g., PPG in older recordings)
+    carry no information about the drift of the device's clock. Their timestamps are rescaled
+    using the drift estimated from another stream (preferably EEG) of the same device,
+    anchored on their first timestamp.
+    """
+    fits = {}
+    regular = []
+    for stream in streams:
+        sfreq = float(stream["info"]["nominal_srate"][0])
+        if sfreq <= 0 or len(stream["time_stamps"]) < 2:
+            continue
+        if _is_regular(stream["time_stamps"], sfreq):
+            regular.append(stream)
+            continue
+
+        frame_size = STREAMS.get(stream["info"]["type"][0], {}).get("frame_size", 1)
+        idxs, offset, period = fit_clock(stream["time_stamps"], sfreq, frame_size)
+        stream["time_stamps"] = offset + period * idxs
+        source = stream["info"]["source_id"][0]
+        if source not in fits or stream["info"]["type"][0] == "EEG":
+            fits[source] = period * sfreq  # Ratio between the actual and nominal periods
+
+    for stream in regular:
+        source = stream["info"]["source_id"][0]
+        if source in fits:
+            timestamps = stream["time_stamps"]
+            stream["time_stamps"] = timestamps[0] + (timestamps - timestamps[0]) * fits[source]
+
+    return streams
+
+
+def dejitter_file(path, output=None):
+    """Re-timestamp all streams of an XDF file and write the result.
+
+    By default, the output is written next to the input, with a '_dejittered' suffix.
+    """
+    if output is None:
+        output = os.path.splitext(path)[0] + "_dejittered.xdf"
+
+    streams, header = load_xdf(path, dejitter_timestamps=False)
+    write_xdf(output, dejitter_streams(streams), header)
+    return output
+
+
+def dejitter_files(paths, output_dir=None, n_jobs=None):
+    """Dejitter several XDF files in parallel (one process per file)."""
+    outputs = [None] * len(paths)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        outputs = [os.path.join(output_dir, os.path.basename(path)) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        for output in executor.map(dejitter_file, paths, outputs):
+            print(f"Written {output}")
@@ -0,0 +1,129 @@
+import math
+
+import mne_lsl.lsl
+import numpy as np
+
+HANDLERS = ["eeg", "ppg", "acc", "gyro"]
+METRICS = ["decode", "push", "latency", "interval"]
+
+
+class Histogram:
+    """Fixed-size histogram of durations (in seconds) with log-spaced bins.
+
+    Bins are allocated once, so adding a value does not allocate any array. The default range
+    (1 µs to 10 s, 20 bins per decade) gives a relative resolution of about 12%.
+    """
+
+    def __init__(self, vmin=1e-6, vmax=10.0, bins_per_decade=20):
+        self._log_min = math.log10(vmin)
+        self._bins_per_decade = bins_per_decade
+        n_bins = int(round((math.log10(vmax) - self._log_min) * bins_per_decade))
+        # Upper edge of each bin, the last bin collects everything above vmax
+        self.edges = 10 ** (self._log_min + (np.arange(n_bins) + 1) / bins_per_decade)
+        self.counts = np.zeros(n_bins + 1, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.counts[:] = 0
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        """Add a duration (in seconds)."""
+        if value > 0:
+            i = int((math.log10(value) - self._log_min) * self._bins_per_decade)
+            i = min(max(i, 0), len(self.edges))
+        else:
+            i = 0
+        self.counts[i] += 1
+        self.n += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Approximate percentile (0-100), returned as the upper edge of the bin."""
+        if self.n == 0:
+            return np.nan
+        i = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.n))
+        if i >= len(self.edges):
+            return self.max
+        return min(self.edges[i], self.max)
+
+    def summary(self):
+        if self.n == 0:
+            mean = np.nan
+        else:
+            mean = self.total / self.n
+        return {
+            "count": self.n,
+            "mean": mean,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Diagnostics:
+    """Low-overhead latency instrumentation of the Muse handlers.
+
+    For each handler ("eeg", "ppg", "acc", "gyro"), the following durations are recorded:
+    "decode" -- time spent unpacking a BLE packet
+    "push" -- time spent in the data callback (e.g., pushing to LSL)
+    "latency" -- time between the arrival of the (first) BLE notification of a frame and the end
+                 of its push
+    "interval" -- time between two consecutive BLE notifications
+
+    Pass an instance to ``Muse(diagnostics=...)`` and query it with ``summary()``.
+    """
+
+    def __init__(self, **kwargs):
+        self.histograms = {h: {m: Histogram(**kwargs) for m in METRICS} for h in HANDLERS}
+        self._last_notification = dict.fromkeys(HANDLERS, None)
+
+    def reset(self):
+        for handler in HANDLERS:
+            for metric in METRICS:
+                self.histograms[handler][metric].reset()
+            self._last_notification[handler] = None
+
+    def record(self, handler, metric, seconds):
+        self.histograms[handler][metric].add(seconds)
+
+    def notification(self, handler, timestamp):
+        """Register the arrival time of a BLE notification."""
+        last = self._last_notification[handler]
+        if last is not None:
+            self.histograms[handler]["interval"].add(timestamp - last)
+        self._last_notification[handler] = timestamp
+
+    def summary(self):
+        """Return a nested dict {handler: {metric: {count, mean, p50, p95, p99, max}}}."""
+        return {h: {m: self.histograms[h][m].summary() for m in METRICS} for h in HANDLERS}
+
+    def make_outlet(self, source_id):
+        """Create the 'DIAGNOSTICS' LSL outlet (median and 99th percentile of each metric)."""
+        ch_names = [f"{h}_{m}_{q}" for h in HANDLERS for m in METRICS for q in ["p50", "p99"]]
+
+        info = mne_lsl.lsl.StreamInfo(
+            "Muse",
+            stype="DIAGNOSTICS",
+            n_channels=len(ch_names),
+            sfreq=0,
+            dtype="float32",
+            source_id=f"{source_id}_diagnostics",
+        )
+        info.desc.append_child_value("manufacturer", "Muse")
+        info.set_channel_names(ch_names)
+        info.set_channel_units("seconds")
+
+        return mne_lsl.lsl.StreamOutlet(info)
+
+    def publish(self, outlet):
+        """Push the current state of the histograms to the 'DIAGNOSTICS' outlet."""
+        sample = [
+            self.histograms[h][m].percentile(q) for h in HANDLERS for m in METRICS for q in [50, 99]
+        ]
+        outlet.push_sample(np.array(sample, dtype=np.float32))
@@ -0,0 +1,194 @@
+import time
+
+import mne_lsl.lsl
+import numpy as np
+
+from .ringbuffer import RingBuffer
+
+
+class RunningAverage:
+    """Incremental mean and variance of epochs (Welford's algorithm).
+
+    Only the mean and the sum of squared deviations are stored, so memory does not grow with
+    the number of epochs.
+    """
+
+    def __init__(self, shape):
+        self.n = 0
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+    def add(self, epoch):
+        self.n += 1
+        delta = epoch - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (epoch - self.mean)
+
+    @property
+    def variance(self):
+        """Unbiased variance (NaN with less than 2 epochs)."""
+        if self.n < 2:
+            return np.full_like(self._m2, np.nan)
+        return self._m2 / (self.n - 1)
+
+
+class ERP:
+    """Event-locked epoching and running ERP averages, in real-time.
+
+    EEG samples are kept in a ring buffer of ``seconds`` seconds. Each marker (of the first
+    channel of the marker stream) is epoched from ``tmin`` to ``tmax`` (in seconds) once the
+    EEG has been received up to ``tmax``, baseline-corrected (mean over ``baseline``, a
+    (start, stop) interval, or None) and added to the running average of its condition (the
+    marker value). Markers whose epoch is no longer in the ring buffer (or older than
+    ``seconds``, e.g., while no EEG is received) are dropped.
+
+    After each update, the average and standard deviation of the condition are pushed to an
+    'ERP' outlet (one per condition, created on the first epoch), as one sample with channels
+    "{channel}_mean_{i}" and "{channel}_sd_{i}" (i being the sample index within the epoch),
+    followed by the number of epochs.
+
+    Example
+    -------
+    erp = ERP(tmin=-0.2, tmax=0.8)
+    erp.run()  # Until CTRL + C
+    erp.averages["target"].mean  # Shape (n_channels, n_times)
+    """
+
+    def __init__(
+        self,
+        tmin=-0.2,
+        tmax=0.8,
+        baseline=(None, 0),
+        seconds=10,
+        marker_stype="Markers",
+        max_conditions=32,
+        timeout=5,
+    ):
+        if tmax <= tmin:
+            raise ValueError("tmax must be greater than tmin.")
+        if seconds < tmax - tmin:
+            raise ValueError("The ring buffer must be longer than the epochs.")
+
+        # Full-rate EEG only (not, e.g., the 'MuseDecimated' streams)
+        eeg = mne_lsl.lsl.resolve_streams(stype="EEG", name="Muse", timeout=timeout)
+        markers = mne_lsl.lsl.resolve_streams(stype=marker_stype, timeout=timeout)
+        if len(eeg) == 0:
+            raise RuntimeError("Can't find EEG stream.")
+        if len(markers) == 0:
+            raise RuntimeError(f"Can't find marker stream (type '{marker_stype}').")
+
+        # Both streams are mapped to the local clock
+        self.eeg = mne_lsl.lsl.StreamInlet(eeg[0], processing_flags=["clocksync"])
+        self.markers = mne_lsl.lsl.StreamInlet(markers[0], processing_flags=["clocksync"])
+        self.eeg.open_stream()
+        self.markers.open_stream()
+
+        info = self.eeg.get_sinfo()
+        self.sfreq = info.sfreq
+        self.ch_names = info.get_channel_names()
+        self.source_id = info.source_id
+        self.ring = RingBuffer(len(self.ch_names), int(seconds * self.sfreq))
+        self.seconds = seconds
+
+        self.tmin = tmin
+        self.n_times = int(round((tmax - tmin) * self.sfreq)) + 1
+        self.times = tmin + np.arange(self.n_times) / self.sfreq
+        self.baseline = None
+        if baseline is not None:
+            start = tmin if baseline[0] is None else baseline[0]
+            stop = tmax if baseline[1] is None else baseline[1]
+            self.baseline = (self.times >= start) & (self.times <= stop)
+
+        self.max_conditions = max_conditions
+        self.averages = {}
+        self.outlets = {}
+        self.pending = []  # (timestamp, condition), in order of arrival
+
+    def update(self):
+        """Pull the new data and markers, and average the epochs that are complete."""
+        samples, timestamps = self.eeg.pull_chunk(timeout=0)
+        if len(timestamps) > 0:
+            self.ring.write(samples, timestamps)
+
+        markers, marker_times = self.markers.pull_chunk(timeout=0)
+        for marker, timestamp in zip(markers, marker_times):
+            self.pending.append((timestamp, str(marker[0])))
+
+        # Their epoch can't be in the buffer anymore (keeps ``pending`` bounded without EEG)
+        expired = mne_lsl.lsl.local_clock() - self.seconds
+        for timestamp, condition in self.pending:
+            if timestamp + self.tmin < expired:
+                print(f"Epoch of marker '{condition}' is no longer in the buffer. Skipping.")
+        self.pending = [(t, condition) for t, condition in self.pending if t + self.tmin >= expired]
+
+        if self.ring.count == 0:
+            return
+        latest = self.ring.latest(1)[1][0]
+        oldest = self.ring.latest(self.ring.capacity)[1][0]
+
+        remaining = []
+        for timestamp, condition in self.pending:
+            start = timestamp + self.tmin
+            if start < oldest:
+                print(f"Epoch of marker '{condition}' is no longer in the buffer. Skipping.")
+            elif start + self.n_times / self.sfreq > latest:
+                remaining.append((timestamp, condition))
+            else:
+                epoch = self._epoch(start)
+                if epoch.shape[1] == self.n_times:  # Incomplete if samples were lost
+                    self._add(epoch, condition)
+        self.pending = remaining
+
+    def run(self, poll=0.02):
+        print("Averaging epochs... (CTRL + C to interrupt)")
+        try:
+            while True:
+                self.update()
+                time.sleep(poll)
+        except KeyboardInterrupt:
+            print("Averaging interrupted.")
+        for condition, average in self.averages.items():
+            print(f"{condition}: {average.n} epochs")
+
+    def _epoch(self, start):
+        """Epoch (n_channels, n_times) starting at the first sample after ``start``."""
+        data, timestamps = self.ring.latest(self.ring.capacity)
+        i = int(np.searchsorted(timestamps, start))
+        epoch = data[i : i + self.n_times].T.astype(np.float64)
+        if self.baseline is not None:
+            epoch -= epoch[:, self.baseline].mean(axis=1, keepdims=True)
+        return epoch
+
+    def _add(self, epoch, condition):
+        if condition not in self.averages:
+            if len(self.averages) >= self.max_conditions:
+                print(f"More than {self.max_conditions} conditions. Ignoring '{condition}'.")
+                return
+            self.averages[condition] = RunningAverage(epoch.shape)
+            self.outlets[condition] = self._make_outlet(condition)
+
+        average = self.averages[condition]
+        average.add(epoch)
+        sample = np.concatenate(
+            [average.mean.ravel(), np.sqrt(average.variance).ravel(), [average.n]]
+        )
+        self.outlets[condition].push_sample(sample.astype(np.float32))
+
+    def _make_outlet(self, condition):
+        ch_names = [
+            f"{ch}_{stat}_{i}" for stat in ["mean", "sd"] for ch in self.ch_names for i in range(self.n_times)
+        ]
+        info = mne_lsl.lsl.StreamInfo(
+            f"MuseERP_{condition}",
+            stype="ERP",
+            n_channels=len(ch_names) + 1,
+            sfreq=0,
+            dtype="float32",
+            source_id=f"{self.source_id}_erp_{condition}",
+        )
+        info.desc.append_child_value("manufacturer", "Muse")
+        info.desc.append_child_value("condition", condition)
+        info.desc.append_child_value("tmin", str(self.tmin))
+        info.desc.append_child_value("sfreq", str(self.sfreq))
+        info.set_channel_names(ch_names + ["n_epochs"])
+        return mne_lsl.lsl.StreamOutlet(info)
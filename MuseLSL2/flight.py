@@ -0,0 +1,152 @@
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+from .ringbuffer import RingBuffer
+from .stream import STREAMS, channel_names
+from .xdf import write_xdf
+
+
+def ring_path(directory, address, stype):
+    """Path of the ring file of a modality (':' are not allowed in file names on Windows)."""
+    return os.path.join(directory, f"Muse_{address.replace(':', '-')}_{stype}.ring")
+
+
+def open_ring(path, n_channels, capacity, dtype=np.float32):
+    """Open (or create) a ring buffer in a memory-mapped file.
+
+    An existing file with the same dimensions is reused, so that the samples written before
+    (e.g., before a crash) are kept and new samples are appended after them.
+    """
+    nbytes = RingBuffer.nbytes(n_channels, capacity, dtype)
+    if os.path.exists(path) and os.path.getsize(path) == nbytes:
+        buffer = np.memmap(path, dtype=np.uint8, mode="r+")
+        ring = RingBuffer.from_buffer(buffer, dtype=dtype)
+        if ring.n_channels == n_channels and ring.capacity == capacity:
+            return ring
+        del ring, buffer
+    buffer = np.memmap(path, dtype=np.uint8, mode="w+", shape=(nbytes,))
+    return RingBuffer(n_channels, capacity, buffer=buffer, dtype=dtype)
+
+
+class FlightRecorder:
+    """Last ``minutes`` minutes of each modality, in memory-mapped ring files.
+
+    Each modality is written (as float32, with its timestamps) to a fixed-size file in
+    ``directory`` (see ``RingBuffer``), whose header holds the number of samples written, so
+    that the content survives a crash of the process. A JSON file next to each ring describes
+    the stream (pyxdf-style info). Use ``add`` as a data callback of each modality, and
+    ``dump`` to export a time range. Timestamps are those of the LSL outlets (see ``add``).
+    """
+
+    def __init__(self, directory, address, modalities, minutes=10, channels=None, flush_interval=10):
+        os.makedirs(directory, exist_ok=True)
+        self.rings = {}
+        self.periods = {stype: 1 / STREAMS[stype]["sfreq"] for stype in modalities}
+        for stype in modalities:
+            spec = STREAMS[stype]
+            ch_names = channel_names(stype, channels)
+            path = ring_path(directory, address, stype)
+            self.rings[stype] = open_ring(path, len(ch_names), int(minutes * 60 * spec["sfreq"]))
+            info = {
+                "name": ["Muse"],
+                "type": [stype],
+                "channel_count": [str(len(ch_names))],
+                "nominal_srate": [str(spec["sfreq"])],
+                "channel_format": ["float32"],
+                "source_id": [f"Muse_{address}"],
+                "desc": [
+                    {
+                        "manufacturer": ["Muse"],
+                        "channels": [
+                            {
+                                "channel": [
+                                    {"label": [ch], "unit": [spec["units"]], "type": [spec["ch_type"]]}
+                                    for ch in ch_names
+                                ]
+                            }
+                        ],
+                    }
+                ],
+            }
+            with open(path + ".json", "w") as f:
+                json.dump(info, f)
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+
+    def add(self, data, timestamps, stype):
+        """Callback receiving the frames of a modality, function(data, timestamps, stype).
+
+        As the outlets (see ``push``), the timestamps are back-filled at the nominal rate from
+        the timestamp of the last sample (the IMU samples of a frame share one timestamp).
+        """
+        n_samples = len(timestamps)
+        timestamps = timestamps[-1] - self.periods[stype] * np.arange(n_samples - 1, -1, -1)
+        self.rings[stype].write(data.T, timestamps)
+
+    def flush(self, force=False):
+        """Write the rings to disk (at most every ``flush_interval`` seconds, unless ``force``).
+
+        This only matters if the machine crashes: the files are up to date for other processes.
+        """
+        now = time.monotonic()
+        if force or now - self._last_flush >= self.flush_interval:
+            for ring in self.rings.values():
+                ring.buffer.flush()
+            self._last_flush = now
+
+
+def load(path, start=None, stop=None, last=None):
+    """Read a ring file (possibly being written) as a pyxdf-style stream.
+
+    start, stop -- time range, in LSL timestamps (default: everything)
+    last -- keep only the last ``last`` seconds (before ``stop``)
+    """
+    with open(path + ".json") as f:
+        info = json.load(f)
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    ring = RingBuffer.from_buffer(buffer, dtype=np.float32)
+    data, timestamps, _ = ring.copy(0)
+
+    if stop is not None:
+        data, timestamps = data[timestamps <= stop], timestamps[timestamps <= stop]
+    if last is not None and len(timestamps) > 0:
+        start = max(start or -np.inf, timestamps[-1] - last)
+    if start is not None:
+        data, timestamps = data[timestamps >= start], timestamps[timestamps >= start]
+    return {"info": info, "time_series": data, "time_stamps": timestamps}
+
+
+def dump(directory="flight", output="flight.xdf", start=None, stop=None, last=None):
+    """Export a time range of all the ring files of ``directory`` to XDF (or NumPy .npz, or a
+    compact '.musez' archive, see ``archive``).
+
+    See ``load`` for the time range. With a '.npz' output, the arrays are named
+    "{source_id}_{type}" (data, shape (n_samples, n_channels)) and "{source_id}_{type}_times".
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "*.ring")))
+    if len(paths) == 0:
+        raise RuntimeError(f"No flight recorder file in '{directory}'.")
+
+    streams = [load(path, start, stop, last) for path in paths]
+    for stream in streams:
+        info = stream["info"]
+        print(f"{info['source_id'][0]} {info['type'][0]}: {len(stream['time_stamps'])} samples")
+
+    if output.endswith(".npz"):
+        arrays = {}
+        for stream in streams:
+            key = f"{stream['info']['source_id'][0]}_{stream['info']['type'][0]}"
+            arrays[key] = stream["time_series"]
+            arrays[f"{key}_times"] = stream["time_stamps"]
+        np.savez(output, **arrays)
+    elif output.endswith(".musez"):
+        from .archive import write_archive
+
+        write_archive(output, streams)
+    else:
+        write_xdf(output, streams)
+    return output
@@ -0,0 +1,102 @@
+from collections import deque
+
+import mne_lsl.lsl
+import numpy as np
+
+from .ringbuffer import RingBuffer
+from .stream import STREAMS, channel_names
+
+
+def make_merged_outlet(address, modalities, channels=None):
+    """Create the outlet carrying all the channels of ``modalities`` on the EEG timebase."""
+    names = {stype: channel_names(stype, channels) for stype in modalities}
+    ch_names = [ch for stype in modalities for ch in names[stype]]
+    ch_types = [STREAMS[stype]["ch_type"] for stype in modalities for _ in names[stype]]
+    units = [STREAMS[stype]["units"] for stype in modalities for _ in names[stype]]
+
+    info = mne_lsl.lsl.StreamInfo(
+        "Muse",
+        stype="MERGED",
+        n_channels=len(ch_names),
+        sfreq=STREAMS["EEG"]["sfreq"],
+        dtype="float32",
+        source_id=f"Muse_{address}",
+    )
+    info.desc.append_child_value("manufacturer", "Muse")
+    info.set_channel_names(ch_names)
+    info.set_channel_types(ch_types)
+    info.set_channel_units(units)
+
+    return mne_lsl.lsl.StreamOutlet(info, chunk_size=STREAMS["EEG"]["chunk_size"])
+
+
+class Merger:
+    """Resample PPG, ACC and GYRO onto the EEG timebase and push all channels to one outlet.
+
+    EEG frames are held until every other modality has received a sample past the end of the
+    frame, or for at most ``lookahead`` seconds. The other modalities are linearly interpolated
+    at the EEG timestamps (holding the first/last value outside of the received samples). Only
+    the last ``history`` samples of each modality are kept. ``stop`` pushes the frames still held.
+    """
+
+    def __init__(self, outlet, modalities, channels=None, lookahead=0.1, history=64):
+        self.outlet = outlet
+        self.lookahead = lookahead
+        self.others = [stype for stype in modalities if stype != "EEG"]
+        self.buffers = {
+            stype: RingBuffer(STREAMS[stype]["n_channels"], history) for stype in self.others
+        }
+        self.n_channels = sum(len(channel_names(stype, channels)) for stype in modalities)
+        self.pending = deque()
+
+    def add(self, data, timestamps, stype):
+        """Callback receiving the frames of any modality, function(data, timestamps, stype)."""
+        if stype == "EEG":
+            self.pending.append((data.T.copy(), np.array(timestamps), mne_lsl.lsl.local_clock()))
+        else:
+            self.buffers[stype].write(data.T, np.asarray(timestamps))
+        self._flush()
+
+    def _ready(self, timestamps):
+        for buffer in self.buffers.values():
+            if buffer.count == 0 or buffer.latest(1)[1][0] < timestamps[-1]:
+                return False
+        return True
+
+    def stop(self):
+        """Push the frames still held (with the samples received so far)."""
+        self._flush(force=True)
+
+    def _flush(self, force=False):
+        now = mne_lsl.lsl.local_clock()
+        while self.pending:
+            data, timestamps, arrival = self.pending[0]
+            if not force and not self._ready(timestamps) and now - arrival < self.lookahead:
+                break
+            self.pending.popleft()
+
+            merged = np.full((len(timestamps), self.n_channels), np.nan, dtype=np.float32)
+            merged[:, : data.shape[1]] = data
+            col = data.shape[1]
+            for buffer in self.buffers.values():
+                if buffer.count > 0:
+                    values, times = buffer.latest(buffer.capacity)
+                    merged[:, col : col + buffer.n_channels] = _interpolate(values, times, timestamps)
+                col += buffer.n_channels
+
+            self.outlet.push_chunk(merged, timestamps[-1])
+
+
+def _interpolate(values, times, t):
+    """Vectorized linear interpolation of ``values`` (n_samples, n_channels) at times ``t``.
+
+    Holds the first/last value outside of ``times``, and tolerates repeated timestamps.
+    """
+    if len(times) == 1:
+        return np.repeat(values, len(t), axis=0)
+    i = np.clip(np.searchsorted(times, t, side="right"), 1, len(times) - 1)
+    t0 = times[i - 1]
+    dt = times[i] - t0
+    w = np.divide(t - t0, dt, out=np.ones_like(t, dtype=np.float64), where=dt > 0)
+    w = np.clip(w, 0, 1)[:, np.newaxis]
+    return values[i - 1] * (1 - w) + values[i] * w
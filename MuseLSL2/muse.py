@@ -1,3 +1,7 @@
+import json
+from collections import deque
+from concurrent.futures import Future
+
 import bitstring
 import mne_lsl.lsl
 import numpy as np
@@ -29,6 +33,22 @@ ATTR_PPG2 = "273e0010-4c4d-454d-96be-f03bac821358"  # infrared 0x3a-0x3c
 ATTR_PPG3 = "273e0011-4c4d-454d-96be-f03bac821358"  # red 0x3d-0x3f
 ATTR_THERMISTOR = "273e0012-4c4d-454d-96be-f03bac821358"  # muse S only, not implemented yet 0x40-0x42
 
+# EEG channels: characteristic and value handle of the notifications
+EEG_CHANNELS = {
+    "TP9": (ATTR_TP9, 32),
+    "AF7": (ATTR_AF7, 35),
+    "AF8": (ATTR_AF8, 38),
+    "TP10": (ATTR_TP10, 41),
+    "AUX": (ATTR_RIGHTAUX, 44),
+}
+
+# Characteristics of the modalities that can be paused while streaming
+MODALITY_ATTRIBUTES = {
+    "PPG": [ATTR_PPG1, ATTR_PPG2, ATTR_PPG3],
+    "ACC": [ATTR_ACCELEROMETER],
+    "GYRO": [ATTR_GYRO],
+}
+
 
 class Muse:
     """Muse EEG headband"""
@@ -44,6 +64,11 @@ class Muse:
         callback_ppg=None,
         preset=None,
         disable_light=False,
+        diagnostics=None,
+        eeg_channels=None,
+        backend=None,
+        control=False,
+        request_timeout=5,
     ):
         """Initialize
 
@@ -55,6 +80,15 @@ class Muse:
         callback_acc -- function(timestamp, samples)
         callback_gyro -- function(timestamp, samples)
         - samples is a list of 3 samples, where each sample is [x, y, z]
+
+        diagnostics -- optional Diagnostics instance recording the latency of the handlers
+        eeg_channels -- EEG channels to subscribe to, among "TP9", "AF7", "AF8", "TP10" and "AUX"
+                        (default: all). The rows of the EEG data follow this order.
+        backend -- backend instance (default: a BleakBackend, created at the first connection
+                   and reused when reconnecting), e.g., a SyntheticBackend to run without hardware
+        control -- subscribe to the control channel, needed to receive the responses of the
+                   ask_* requests (implied by callback_control)
+        request_timeout -- seconds after which a request without response fails
         """
 
         self.address = address
@@ -66,7 +100,7 @@ class Muse:
         self.callback_ppg = callback_ppg
 
         self.enable_eeg = not callback_eeg is None
-        self.enable_control = not callback_control is None
+        self.enable_control = control or callback_control is not None
         self.enable_telemetry = not callback_telemetry is None
         self.enable_acc = not callback_acc is None
         self.enable_gyro = not callback_gyro is None
@@ -74,13 +108,31 @@ class Muse:
 
         self.preset = preset
         self.disable_light = disable_light
+        self.diagnostics = diagnostics
+        self.backend = backend
+        self.adapter = None  # Created at the first connection, and reused by reconnect()
+        self.request_timeout = request_timeout
+        self._requests = deque()  # (future, deadline, keys), in the order of the commands
+        self.paused = set()  # Modalities whose notifications are disabled (see pause_modality)
+        # Frames received and lost (estimated from the packet counters) since the creation
+        self.n_frames = {"EEG": 0, "PPG": 0}
+        self.n_lost = {"EEG": 0.0, "PPG": 0.0}
+
+        if eeg_channels is None:
+            eeg_channels = list(EEG_CHANNELS)
+        for channel in eeg_channels:
+            if channel not in EEG_CHANNELS:
+                raise ValueError(f"Unknown EEG channel '{channel}' (must be in {list(EEG_CHANNELS)}).")
+        self.eeg_channels = list(eeg_channels)
+        self._eeg_index = {EEG_CHANNELS[ch][1]: i for i, ch in enumerate(self.eeg_channels)}
 
     def connect(self):
         """Connect to the device"""
 
         print(f"Connecting to {self.address}...")
-        self.adapter = BleakBackend()
-        self.adapter.start()
+        if self.adapter is None:
+            self.adapter = BleakBackend() if self.backend is None else self.backend
+            self.adapter.start()
         self.device = self.adapter.connect(self.address)
 
         # Send a preset to the device to enable some functionalities
@@ -97,13 +149,13 @@ class Muse:
         if self.enable_telemetry:
             self._subscribe_telemetry()
 
-        if self.enable_acc:
+        if self.enable_acc and "ACC" not in self.paused:
             self._subscribe_acc()
 
-        if self.enable_gyro:
+        if self.enable_gyro and "GYRO" not in self.paused:
             self._subscribe_gyro()
 
-        if self.enable_ppg:
+        if self.enable_ppg and "PPG" not in self.paused:
             self._subscribe_ppg()
 
         if self.disable_light:
@@ -123,12 +175,39 @@ class Muse:
         cmd -- string to send"""
         self._write_cmd([len(cmd) + 1, *(ord(char) for char in cmd), ord("\n")])
 
+    def request(self, cmd, timeout=None, keys=("rc",)):
+        """Send a command string and return a Future of its response (a dict).
+
+        Responses are matched to the requests in order, among the requests whose ``keys`` are
+        all in the response (other commands, e.g., 'd' or the keep-alive, also get responses
+        like {"rc": 0}, which are ignored if no request expects them). The Future fails with a
+        TimeoutError if no response is received within ``timeout`` seconds (default:
+        ``request_timeout``), which is checked when a response arrives or ``expire_requests()``
+        is called. This never blocks: use ``future.result(timeout)`` to wait from another
+        thread, or poll ``future.done()`` from the thread running the backend.
+        """
+        future = Future()
+        if not self.enable_control:
+            future.set_exception(RuntimeError("Control is not enabled, use Muse(control=True)."))
+            return future
+
+        if timeout is None:
+            timeout = self.request_timeout
+        self._requests.append((future, mne_lsl.lsl.local_clock() + timeout, set(keys)))
+        self._write_cmd_str(cmd)
+        return future
+
+    def expire_requests(self):
+        """Fail the requests whose response did not arrive in time."""
+        now = mne_lsl.lsl.local_clock()
+        while self._requests and self._requests[0][1] < now:
+            _settle(self._requests.popleft()[0], exception=TimeoutError("No response from the device."))
+
     def ask_control(self):
         """Send a message to Muse to ask for the control status.
 
-        Only useful if control is enabled (to receive the answer!)
-
-        The message received is a dict with the following keys:
+        Returns a Future of the response (see ``request()``), which is a dict with the
+        following keys:
         "hn": device name
         "sn": serial number
         "ma": MAC address
@@ -138,12 +217,13 @@ class Muse:
         "ps": preset selected
         "rc": return status, if 0 is OK
         """
-        self._write_cmd_str("s")
+        return self.request("s", keys=("hn", "rc"))
 
     def ask_device_info(self):
         """Send a message to Muse to ask for the device info.
 
-        The message received is a dict with the following keys:
+        Returns a Future of the response (see ``request()``), which is a dict with the
+        following keys:
         "ap":
         "sp":
         "tp": firmware type, e.g: "consumer"
@@ -154,18 +234,20 @@ class Muse:
         "pv": protocol version?
         "rc": return status, if 0 is OK
         """
-        self._write_cmd_str("v1")
+        return self.request("v1", keys=("fw", "rc"))
 
     def ask_reset(self):
         """Undocumented command reset for '*1'
-        The message received is a singleton with:
+        Returns a Future of the response, a singleton with:
         "rc": return status, if 0 is OK
         """
-        self._write_cmd_str("*1")
+        return self.request("*1")
 
     def start(self):
         """Start streaming."""
         self.first_sample = True
+        self._resync = False
+        self._resync_ppg = False
         self._init_sample()
         self._init_ppg_sample()
         self.last_tm = 0
@@ -173,6 +255,76 @@ class Muse:
         self._init_control()
         self.resume()
 
+    def reconnect(self):
+        """Reconnect to the device and resume streaming.
+
+        The clock-sync state (sample indices and regression parameters) is kept, so that
+        timestamps continue on the same timeline. The sample indices are moved forward to
+        account for the interruption when the first packets arrive.
+        """
+        try:
+            self.device.disconnect()
+        except Exception:
+            pass
+
+        # The responses to the pending requests are lost
+        while self._requests:
+            error = ConnectionError("Disconnected before the response.")
+            _settle(self._requests.popleft()[0], exception=error)
+
+        self.connect()
+        self._restart_frames()
+        self._init_control()
+        self.resume()
+
+    def _restart_frames(self):
+        """Start new frames after an interruption (the timestamps skip the interruption)."""
+        self._resync = not self.first_sample
+        self._resync_ppg = not self.first_sample
+        self._init_sample()
+        self._init_ppg_sample()
+        self.last_tm = 0
+        self.last_tm_ppg = 0
+
+    def change_preset(self, preset):
+        """Switch to another preset while streaming (streaming is paused during the switch)."""
+        self.stop()
+        self.select_preset(preset)
+        self.preset = preset
+        self._restart_frames()
+        self.resume()
+
+    def pause_modality(self, stype):
+        """Disable the notifications of "PPG", "ACC" or "GYRO", so that the device stops sending
+        them (e.g., to free Bluetooth bandwidth). The streams and callbacks are kept."""
+        if stype in self.paused:
+            return
+        for uuid in MODALITY_ATTRIBUTES[stype]:
+            self.device.unsubscribe(uuid)
+        self.paused.add(stype)
+
+    def resume_modality(self, stype):
+        """Enable the notifications of a paused modality again."""
+        if stype not in self.paused:
+            return
+        self.paused.discard(stype)
+        if stype == "PPG":
+            self._resync_ppg = not self.first_sample
+            self._init_ppg_sample()
+            self.last_tm_ppg = 0
+        {"PPG": self._subscribe_ppg, "ACC": self._subscribe_acc, "GYRO": self._subscribe_gyro}[stype]()
+
+    @property
+    def modalities(self):
+        """Modalities currently streamed (enabled and not paused)."""
+        enabled = [
+            ("EEG", self.enable_eeg),
+            ("PPG", self.enable_ppg),
+            ("ACC", self.enable_acc),
+            ("GYRO", self.enable_gyro),
+        ]
+        return [stype for stype, enable in enabled if enable and stype not in self.paused]
+
     def resume(self):
         """Resume streaming, sending 'd' command"""
         self._write_cmd_str("d")
@@ -216,12 +368,9 @@ class Muse:
             self.adapter.stop()
 
     def _subscribe_eeg(self):
-        """subscribe to eeg stream."""
-        self.device.subscribe(ATTR_TP9, callback=self._handle_eeg)
-        self.device.subscribe(ATTR_AF7, callback=self._handle_eeg)
-        self.device.subscribe(ATTR_AF8, callback=self._handle_eeg)
-        self.device.subscribe(ATTR_TP10, callback=self._handle_eeg)
-        self.device.subscribe(ATTR_RIGHTAUX, callback=self._handle_eeg)
+        """subscribe to eeg stream (selected channels only)."""
+        for channel in self.eeg_channels:
+            self.device.subscribe(EEG_CHANNELS[channel][0], callback=self._handle_eeg)
 
     def _unpack_eeg_channel(self, packet):
         """Decode data packet of one EEG channel.
@@ -242,8 +391,9 @@ class Muse:
 
     def _init_sample(self):
         """initialize array to store the samples"""
-        self.timestamps = np.full(5, np.nan)
-        self.data = np.zeros((5, 12))
+        self.timestamps = np.full(len(self.eeg_channels), np.nan)
+        self.data = np.zeros((len(self.eeg_channels), 12))
+        self._eeg_received = 0
 
     def _init_ppg_sample(self):
         """Initialise array to store PPG samples
@@ -289,52 +439,84 @@ class Muse:
         """Callback for receiving a sample.
 
         samples are received in this order : 44, 41, 38, 32, 35
-        wait until we get 35 and call the data callback
+        wait until all subscribed channels are received and call the data callback. If a
+        notification is lost, the incomplete frame is pushed when the next one starts.
         """
         if self.first_sample:
             self._init_timestamp_correction()
             self.first_sample = False
 
         timestamp = mne_lsl.lsl.local_clock()
-        index = int((handle - 32) / 3)
+        index = self._eeg_index[handle]
         tm, d = self._unpack_eeg_channel(data)
 
+        if self.diagnostics is not None:
+            self.diagnostics.notification("eeg", timestamp)
+            self.diagnostics.record("eeg", "decode", mne_lsl.lsl.local_clock() - timestamp)
+
+        # a notification of the previous frame was lost
+        if self._eeg_received > 0 and tm != self._eeg_tm:
+            self._push_eeg_frame()
+
         if self.last_tm == 0:
             self.last_tm = tm - 1
 
+        self._eeg_tm = tm
         self.data[index] = d
         self.timestamps[index] = timestamp
+        self._eeg_received += 1
         # last data received
-        if handle == 35:
-            if tm != self.last_tm + 1:
-                if (tm - self.last_tm) != -65535:  # counter reset
-                    print("missing sample %d : %d" % (tm, self.last_tm))
-                    # correct sample index for timestamp estimation
-                    self.sample_index += 12 * (tm - self.last_tm + 1)
-
-            self.last_tm = tm
-
-            # calculate index of time samples
-            idxs = np.arange(0, 12) + self.sample_index
-            self.sample_index += 12
+        if self._eeg_received == len(self.eeg_channels):
+            self._push_eeg_frame()
+
+    def _push_eeg_frame(self):
+        """Timestamp the current EEG frame and call the data callback."""
+        tm = self._eeg_tm
+        self.n_frames["EEG"] += 1
+        # Notifications lost within the frame
+        self.n_lost["EEG"] += 1 - self._eeg_received / len(self.eeg_channels)
+        if tm != self.last_tm + 1:
+            if (tm - self.last_tm) != -65535:  # counter reset
+                self.n_lost["EEG"] += (tm - self.last_tm - 1) % 65536
+                print("missing sample %d : %d" % (tm, self.last_tm))
+                # correct sample index for timestamp estimation
+                self.sample_index += 12 * (tm - self.last_tm + 1)
+
+        self.last_tm = tm
+
+        # after a reconnection, skip the samples lost during the interruption
+        if self._resync:
+            lost = (np.nanmin(self.timestamps) - self.reg_params[0]) / self.reg_params[1] - 11
+            self.sample_index = max(self.sample_index, int(round(lost)))
+            self._resync = False
+
+        # calculate index of time samples
+        idxs = np.arange(0, 12) + self.sample_index
+        self.sample_index += 12
+
+        # update timestamp correction
+        # We received the first packet as soon as the last timestamp got
+        # sampled
+        self._update_timestamp_correction(idxs[-1], np.nanmin(self.timestamps))
+
+        # timestamps are extrapolated backwards based on sampling rate
+        # and current time
+        timestamps = self.reg_params[1] * idxs + self.reg_params[0]
+
+        # push data
+        t_push = mne_lsl.lsl.local_clock()
+        self.callback_eeg(self.data, timestamps)
+
+        if self.diagnostics is not None:
+            t_end = mne_lsl.lsl.local_clock()
+            self.diagnostics.record("eeg", "push", t_end - t_push)
+            self.diagnostics.record("eeg", "latency", t_end - np.nanmin(self.timestamps))
 
-            # update timestamp correction
-            # We received the first packet as soon as the last timestamp got
-            # sampled
-            self._update_timestamp_correction(idxs[-1], np.nanmin(self.timestamps))
-
-            # timestamps are extrapolated backwards based on sampling rate
-            # and current time
-            timestamps = self.reg_params[1] * idxs + self.reg_params[0]
-
-            # push data
-            self.callback_eeg(self.data, timestamps)
-
-            # save last timestamp for disconnection timer
-            self.last_timestamp = timestamps[-1]
+        # save last timestamp for disconnection timer
+        self.last_timestamp = timestamps[-1]
 
-            # reset sample
-            self._init_sample()
+        # reset sample
+        self._init_sample()
 
     def _init_control(self):
         """Variable to store the current incoming message."""
@@ -383,10 +565,31 @@ class Muse:
         self._current_msg += incoming_message
 
         if incoming_message[-1] == "}":  # Message ended completely
-            self.callback_control(self._current_msg)
+            if self.callback_control is not None:
+                self.callback_control(self._current_msg)
+            self._resolve_request(self._current_msg)
 
             self._init_control()
 
+    def _resolve_request(self, message):
+        """Set the result of the oldest pending request expecting the keys of the message."""
+        self.expire_requests()
+        # Cancelled requests don't take a response
+        self._requests = deque(request for request in self._requests if not request[0].done())
+        if not self._requests:
+            return
+        try:
+            response = json.loads(message)
+        except json.JSONDecodeError:
+            error = ValueError(f"Invalid response from the device: {message!r}")
+            _settle(self._requests.popleft()[0], exception=error)
+            return
+        for request in self._requests:
+            if request[2] <= response.keys():
+                self._requests.remove(request)
+                _settle(request[0], response)
+                return
+
     def _subscribe_telemetry(self):
         self.device.subscribe(ATTR_TELEMETRY, callback=self._handle_telemetry)
 
@@ -443,7 +646,16 @@ class Muse:
         # MUSE_ACCELEROMETER_SCALE_FACTOR (no idea where this comes from)
         packet_index, samples = self._unpack_imu_channel(packet, scale=0.0000610352)
 
-        self.callback_acc(samples, timestamps)
+        if self.diagnostics is None:
+            self.callback_acc(samples, timestamps)
+        else:
+            t_push = mne_lsl.lsl.local_clock()
+            self.diagnostics.notification("acc", timestamps[-1])
+            self.diagnostics.record("acc", "decode", t_push - timestamps[-1])
+            self.callback_acc(samples, timestamps)
+            t_end = mne_lsl.lsl.local_clock()
+            self.diagnostics.record("acc", "push", t_end - t_push)
+            self.diagnostics.record("acc", "latency", t_end - timestamps[-1])
 
     def _subscribe_gyro(self):
         self.device.subscribe(ATTR_GYRO, callback=self._handle_gyro)
@@ -463,7 +675,16 @@ class Muse:
         # MUSE_GYRO_SCALE_FACTOR (no idea where this number comes from)
         packet_index, samples = self._unpack_imu_channel(packet, scale=0.0074768)
 
-        self.callback_gyro(samples, timestamps)
+        if self.diagnostics is None:
+            self.callback_gyro(samples, timestamps)
+        else:
+            t_push = mne_lsl.lsl.local_clock()
+            self.diagnostics.notification("gyro", timestamps[-1])
+            self.diagnostics.record("gyro", "decode", t_push - timestamps[-1])
+            self.callback_gyro(samples, timestamps)
+            t_end = mne_lsl.lsl.local_clock()
+            self.diagnostics.record("gyro", "push", t_end - t_push)
+            self.diagnostics.record("gyro", "latency", t_end - timestamps[-1])
 
     def _subscribe_ppg(self):
         """subscribe to ppg stream."""
@@ -481,6 +702,10 @@ class Muse:
         index = int((handle - 56) / 3)
         tm, d = self._unpack_ppg_channel(data)
 
+        if self.diagnostics is not None:
+            self.diagnostics.notification("ppg", timestamp)
+            self.diagnostics.record("ppg", "decode", mne_lsl.lsl.local_clock() - timestamp)
+
         if self.last_tm_ppg == 0:
             self.last_tm_ppg = tm - 1
 
@@ -488,10 +713,19 @@ class Muse:
         self.timestamps_ppg[index] = timestamp
         # last data received
         if handle == 62:
+            self.n_frames["PPG"] += 1
             if tm != self.last_tm_ppg + 1:
+                self.n_lost["PPG"] += (tm - self.last_tm_ppg - 1) % 65536
                 print("missing sample %d : %d" % (tm, self.last_tm_ppg))
             self.last_tm_ppg = tm
 
+            # after a reconnection, skip the samples lost during the interruption
+            if self._resync_ppg:
+                t0, period = self.reg_ppg_sample_rate
+                lost = (np.nanmin(self.timestamps_ppg) - t0) / period - 5
+                self.sample_index_ppg = max(self.sample_index_ppg, int(round(lost)))
+                self._resync_ppg = False
+
             # calculate index of time samples
             idxs = np.arange(0, 6) + self.sample_index_ppg
             self.sample_index_ppg += 6
@@ -504,8 +738,14 @@ class Muse:
 
             # push data
             if self.callback_ppg:
+                t_push = mne_lsl.lsl.local_clock()
                 self.callback_ppg(self.data_ppg, timestamps)
 
+                if self.diagnostics is not None:
+                    t_end = mne_lsl.lsl.local_clock()
+                    self.diagnostics.record("ppg", "push", t_end - t_push)
+                    self.diagnostics.record("ppg", "latency", t_end - np.nanmin(self.timestamps_ppg))
+
             # reset sample
             self._init_ppg_sample()
 
@@ -525,3 +765,13 @@ class Muse:
 
     def _disable_light(self):
         self._write_cmd_str("L0")
+
+
+def _settle(future, result=None, exception=None):
+    """Set the outcome of a request, unless it was cancelled (which would raise in the callback)."""
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
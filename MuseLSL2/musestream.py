@@ -0,0 +1,186 @@
+import asyncio
+import threading
+from functools import partial
+
+import numpy as np
+
+from .muse import Muse
+from .ringbuffer import RingBuffer
+from .stream import STREAMS, channel_names, make_outlet, push, supervise
+
+
+class MuseStream:
+    """In-process access to the data of a Muse, without an LSL round-trip.
+
+    The device is handled in a background thread, which writes the decoded frames into one
+    preallocated ring buffer per modality ("EEG", "PPG", "ACC", "GYRO"). The data can optionally
+    be mirrored to the usual LSL outlets (``lsl=True``).
+
+    The methods return NumPy views into the ring buffers, which remain valid until the buffer
+    wraps around (i.e., for ``seconds`` seconds). Copy them to keep them longer. Once the
+    stream has ended (stopped, device lost or error), ``pull()`` and ``wait_for()`` raise a
+    ConnectionError instead of waiting for samples that will not come.
+
+    Example
+    -------
+    with MuseStream("00:55:DA:B5:E8:CF") as muse:
+        data, timestamps = muse.wait_for(256)  # Next second of EEG, shape (256, 5)
+        data, timestamps = muse.latest(2, stype="PPG")  # Last 2 seconds of PPG
+    """
+
+    def __init__(
+        self,
+        address,
+        ppg=True,
+        acc=True,
+        gyro=True,
+        preset=None,
+        seconds=30,
+        lsl=False,
+        stall_timeout=5,
+        max_retries=10,
+        channels=None,
+    ):
+        self.address = address
+        self.channels = channels
+        self.preset = preset
+        self.stall_timeout = stall_timeout
+        self.max_retries = max_retries
+        self.modalities = ["EEG"]
+        self.modalities += [m for m, enabled in [("PPG", ppg), ("ACC", acc), ("GYRO", gyro)] if enabled]
+
+        self.rings = {
+            stype: RingBuffer(
+                len(channel_names(stype, channels)), int(seconds * STREAMS[stype]["sfreq"])
+            )
+            for stype in self.modalities
+        }
+        self.positions = dict.fromkeys(self.modalities, 0)
+        self.outlets = {}
+        if lsl:
+            self.outlets = {stype: make_outlet(stype, address, channels) for stype in self.modalities}
+
+        self._new_data = threading.Condition()
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._error = None
+        self._ended = None  # Why the background thread ended (an exception)
+        self._thread = None
+
+    def start(self, timeout=30):
+        """Connect to the device and start streaming (in a background thread)."""
+        self._stop.clear()
+        self._connected.clear()
+        self._ended = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+        if not self._connected.wait(timeout):
+            self.stop()
+            raise TimeoutError(f"Could not connect to {self.address} within {timeout} seconds.")
+        if self._error is not None:
+            raise RuntimeError(f"Could not connect to {self.address}.") from self._error
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def pull(self, n=None, stype="EEG"):
+        """Return the oldest unread samples (at most ``n``), as views (data, timestamps).
+
+        Raises a ConnectionError if there is no unread sample and the stream has ended.
+        """
+        ring = self.rings[stype]
+        stop = ring.count
+        if stop == self.positions[stype]:
+            self._raise_if_ended()
+        if n is not None:
+            stop = min(stop, max(self.positions[stype], stop - ring.capacity) + n)
+        data, timestamps = ring.read(self.positions[stype], stop)
+        self.positions[stype] = stop
+        return data, timestamps
+
+    def latest(self, seconds, stype="EEG"):
+        """Return the last ``seconds`` of data, as views (data, timestamps)."""
+        return self.rings[stype].latest(int(seconds * STREAMS[stype]["sfreq"]))
+
+    def wait_for(self, n, stype="EEG", timeout=None):
+        """Block until ``n`` unread samples are available, and return them (see ``pull()``).
+
+        Raises a ConnectionError if the stream ends before.
+        """
+        ring = self.rings[stype]
+        with self._new_data:
+            self._new_data.wait_for(
+                lambda: ring.count - self.positions[stype] >= n or self._ended is not None, timeout
+            )
+        if ring.count - self.positions[stype] >= n:
+            return self.pull(n, stype)
+        self._raise_if_ended()
+        raise TimeoutError(f"Less than {n} {stype} samples received within {timeout} seconds.")
+
+    def _raise_if_ended(self):
+        if self._ended is not None:
+            raise ConnectionError(f"The stream of {self.address} has ended.") from self._ended
+
+    def _end(self, reason):
+        """Record why the stream ended (the first reason is kept) and wake up the readers."""
+        with self._new_data:
+            if self._ended is None:
+                self._ended = reason
+            self._new_data.notify_all()
+
+    def _write(self, data, timestamps, stype):
+        self.rings[stype].write(data.T, np.asarray(timestamps))
+        if stype in self.outlets:
+            push(data, timestamps, self.outlets[stype])
+        with self._new_data:
+            self._new_data.notify_all()
+
+    def _run(self):
+        # The BLE backend needs an event loop in this thread
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+        callbacks = {stype: partial(self._write, stype=stype) for stype in self.modalities}
+        muse = Muse(
+            address=self.address,
+            callback_eeg=callbacks["EEG"],
+            callback_ppg=callbacks.get("PPG"),
+            callback_acc=callbacks.get("ACC"),
+            callback_gyro=callbacks.get("GYRO"),
+            preset=self.preset,
+            eeg_channels=self.channels,
+        )
+        try:
+            muse.connect()
+            muse.start()
+        except Exception as e:
+            self._error = e
+            self._end(e)
+            self._connected.set()
+            return
+        self._connected.set()
+
+        try:
+            if not supervise(muse, self.stall_timeout, max_retries=self.max_retries, stop=self._stop):
+                print(f"Could not reconnect after {self.max_retries} attempts. Disconnecting...")
+                self._end(ConnectionError(f"Could not reconnect after {self.max_retries} attempts."))
+        except Exception as e:
+            self._end(e)
+            raise
+        finally:
+            try:
+                muse.stop()
+                muse.disconnect()
+            except Exception:
+                pass
+            self._end(ConnectionError("The stream was stopped."))
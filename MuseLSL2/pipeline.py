@@ -0,0 +1,288 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+from .diagnostics import Histogram
+
+
+class Stage:
+    """Processing stage of a ``Pipeline``.
+
+    Subclasses override ``process(data, timestamps)``, which receives a block of shape
+    (n_channels, n_samples) and its timestamps, and returns the output block and timestamps
+    (or None to stop the processing of this block, e.g., for sinks). Stages that produce new
+    data should write it into a buffer allocated once in ``setup()``.
+
+    threaded -- run this stage (and the following ones, until the next threaded stage) in its
+                own worker thread, fed by a queue of ``maxsize`` preallocated blocks. When the
+                queue is full, blocks are dropped rather than blocking the caller.
+    """
+
+    def __init__(self, name=None, threaded=False, maxsize=64):
+        self.name = name or type(self).__name__
+        self.threaded = threaded
+        self.maxsize = maxsize
+        self.time = Histogram()
+
+    def setup(self, shape):
+        """Called with the shape of the first input block. Returns the shape of the output."""
+        return shape
+
+    def process(self, data, timestamps):
+        return data, timestamps
+
+
+class Function(Stage):
+    """Stage wrapping a function(data, timestamps), returning (data, timestamps) or None."""
+
+    def __init__(self, function, name=None, **kwargs):
+        Stage.__init__(self, name or getattr(function, "__name__", None), **kwargs)
+        self.function = function
+
+    def process(self, data, timestamps):
+        return self.function(data, timestamps)
+
+
+class Filter(Stage):
+    """Causal IIR filter (coefficients ``b``, ``a``, e.g., from scipy.signal.butter).
+
+    The filter state is kept between blocks (transposed direct form II, as ``zi`` of
+    scipy.signal.lfilter). A block of n samples is filtered at once, as two matrix products
+    (state-space form: the response to the state and the convolution with the impulse
+    response), with matrices computed once per block size. The output and the new state are
+    written into buffers allocated in ``setup()``. As with any direct form, high-order filters
+    are better split into several second-order stages.
+    """
+
+    def __init__(self, b, a, **kwargs):
+        Stage.__init__(self, **kwargs)
+        a = np.asarray(a, dtype=np.float64)
+        self.b = np.asarray(b, dtype=np.float64) / a[0]
+        self.a = a / a[0]
+        self.order = max(len(self.a), len(self.b)) - 1
+        self.b = np.pad(self.b, (0, self.order + 1 - len(self.b)))
+        self.a = np.pad(self.a, (0, self.order + 1 - len(self.a)))
+
+    def setup(self, shape):
+        self.state = np.zeros((shape[0], self.order))
+        self._matrices = {}  # n_samples -> (matrices, output and scratch buffers)
+        self._block(shape[1])
+        return shape
+
+    def _block(self, n):
+        """Matrices filtering ``n`` samples: out = state @ to_out + data @ impulse, and
+        new state = state @ to_state + data @ from_data (with output and scratch buffers)."""
+        if n not in self._matrices:
+            order, b0 = self.order, self.b[0]
+            # z' = A z + B x and y = C z + b0 x, with C = [1, 0, ...]
+            A = np.eye(order, k=1)
+            A[:, :1] -= self.a[1:, np.newaxis]
+            B = self.b[1:] - self.a[1:] * b0
+            C = np.eye(1, order)[0]
+            powers = [np.eye(order)]
+            for _ in range(n):
+                powers.append(A @ powers[-1])
+            to_out = np.array([C @ power for power in powers[:n]]).reshape(n, order).T
+            response = np.concatenate([[b0], [C @ power @ B for power in powers[: n - 1]]])
+            impulse = np.zeros((n, n))  # impulse[k, i] = response[i - k]
+            for k in range(n):
+                impulse[k, k:] = response[: n - k]
+            to_state = powers[n].T
+            from_data = np.array([powers[n - 1 - k] @ B for k in range(n)]).reshape(n, order)
+            n_channels = self.state.shape[0]
+            scratch = [np.empty((n_channels, n)) for _ in range(2)]
+            scratch += [np.empty((n_channels, order)) for _ in range(2)]
+            self._matrices[n] = (to_out, impulse, to_state, from_data), scratch
+        return self._matrices[n]
+
+    def process(self, data, timestamps):
+        n = data.shape[1]
+        (to_out, impulse, to_state, from_data), (result, out, state, tmp) = self._block(n)
+        np.matmul(data, impulse, out=result)
+        if self.order > 0:
+            result += np.matmul(self.state, to_out, out=out)
+            np.matmul(self.state, to_state, out=state)
+            state += np.matmul(data, from_data, out=tmp)
+            self.state[...] = state
+        return result, timestamps
+
+
+class Outlet(Stage):
+    """Sink pushing the blocks to an LSL outlet."""
+
+    def __init__(self, outlet, **kwargs):
+        Stage.__init__(self, **kwargs)
+        self.outlet = outlet
+
+    def process(self, data, timestamps):
+        self.outlet.push_chunk(np.ascontiguousarray(data.T, dtype=np.float32), timestamps[-1])
+
+
+class Recorder(Stage):
+    """Sink appending the blocks to a ``RingBuffer``."""
+
+    def __init__(self, ring, **kwargs):
+        Stage.__init__(self, **kwargs)
+        self.ring = ring
+
+    def process(self, data, timestamps):
+        self.ring.write(data.T, np.asarray(timestamps))
+
+
+class Pipeline:
+    """Chain of vectorized stages processing the frames of a modality.
+
+    A pipeline is a data callback (function(data, timestamps)) that can be passed to ``Muse``
+    (or to ``stream(pipelines=...)``). It receives the frames after decoding and clock
+    synchronization (whose cost is measured by ``Diagnostics``). Stages run in the calling
+    thread until the first ``threaded`` stage, so expensive processing does not block the BLE
+    callbacks. Blocks passed between stages are only valid until the next block: copy them to
+    keep them.
+
+    Example
+    -------
+    pipeline = Pipeline([Filter(b, a, threaded=True), Function(band_power), Outlet(outlet)])
+    pipeline.start()
+    muse = Muse(address, callback_eeg=pipeline)
+    ...
+    pipeline.stop()
+    print(pipeline.summary())
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        # Split the stages into segments, each running in one thread
+        self.segments = []
+        for stage in self.stages:
+            if stage.threaded or not self.segments:
+                self.segments.append(_Segment(stage.threaded, stage.maxsize))
+            self.segments[-1].stages.append(stage)
+        for segment, following in zip(self.segments, self.segments[1:] + [None]):
+            segment.next = following
+        self._ready = False
+
+    def start(self):
+        for segment in self.segments:
+            segment.start()
+
+    def stop(self, timeout=5):
+        """Process the queued blocks and stop the worker threads."""
+        for segment in self.segments:
+            segment.stop(timeout)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __call__(self, data, timestamps):
+        if not self._ready:
+            self._setup(np.shape(data))
+        self.segments[0].put(data, timestamps)
+
+    def _setup(self, shape):
+        for segment in self.segments:
+            shape = segment.setup(shape)
+        self._ready = True
+
+    def summary(self):
+        """Return a dict {stage: {"time": {count, mean, p50, ...}, "queue": {mean, max, dropped}}}.
+
+        "queue" describes the queue in front of the thread running the stage (all zeros for the
+        stages running in the calling thread).
+        """
+        return {
+            stage.name: {"time": stage.time.summary(), "queue": segment.depth()}
+            for segment in self.segments
+            for stage in segment.stages
+        }
+
+
+class _Segment:
+    """Consecutive stages running in the same thread."""
+
+    def __init__(self, threaded, maxsize):
+        self.threaded = threaded
+        self.maxsize = maxsize
+        self.stages = []
+        self.next = None
+        self.dropped = 0
+        self._depth_total = 0
+        self._depth_max = 0
+        self._n_put = 0
+        self._thread = None
+        if threaded:
+            self.queue = queue.Queue(maxsize)
+
+    def setup(self, shape):
+        if self.threaded:
+            # One block per queue slot, plus the one being processed and the one being written
+            n_slots = self.maxsize + 2
+            self.data = np.empty((n_slots,) + tuple(shape))
+            self.timestamps = np.empty((n_slots, shape[1]))
+            self.slot = 0
+        for stage in self.stages:
+            shape = stage.setup(shape)
+        return shape
+
+    def start(self):
+        if self.threaded and self._thread is None:
+            self._thread = threading.Thread(target=self._work, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        if self._thread is not None:
+            try:
+                self.queue.put(None, timeout=timeout)
+                self._thread.join(timeout)
+            except queue.Full:
+                print(f"Pipeline stage '{self.stages[0].name}' did not stop within {timeout} seconds.")
+            self._thread = None
+
+    def put(self, data, timestamps):
+        if not self.threaded:
+            self.run(data, timestamps)
+            return
+
+        depth = self.queue.qsize()
+        self._n_put += 1
+        self._depth_total += depth
+        self._depth_max = max(self._depth_max, depth)
+        if depth >= self.maxsize or np.shape(data) != self.data.shape[1:]:
+            self.dropped += 1
+            return
+
+        slot = self.slot
+        self.data[slot] = data
+        self.timestamps[slot] = timestamps
+        self.slot = (slot + 1) % len(self.data)
+        self.queue.put_nowait(slot)
+
+    def run(self, data, timestamps):
+        for stage in self.stages:
+            t0 = time.perf_counter()
+            out = stage.process(data, timestamps)
+            stage.time.add(time.perf_counter() - t0)
+            if out is None:
+                return
+            data, timestamps = out
+        if self.next is not None:
+            self.next.put(data, timestamps)
+
+    def depth(self):
+        return {
+            "mean": self._depth_total / self._n_put if self._n_put else 0.0,
+            "max": self._depth_max,
+            "dropped": self.dropped,
+        }
+
+    def _work(self):
+        while True:
+            slot = self.queue.get()
+            if slot is None:
+                return
+            self.run(self.data[slot], self.timestamps[slot])
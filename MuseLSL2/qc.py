@@ -0,0 +1,210 @@
+import glob
+import hashlib
+import html
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .archive import SCALES
+from .dejitter import fit_clock
+from .stream import STREAMS
+from .xdf import load_xdf
+
+# Range of the codes sent by the device, per modality (12-bit EEG, 24-bit PPG, 16-bit IMU)
+CODE_LIMITS = {
+    "EEG": (0, 2**12 - 1),
+    "PPG": (0, 2**24 - 1),
+    "ACC": (-(2**15), 2**15 - 1),
+    "GYRO": (-(2**15), 2**15 - 1),
+}
+
+# Columns of the summary table: (key, header, format)
+COLUMNS = [
+    ("type", "Stream", "{}"),
+    ("n_samples", "Samples", "{}"),
+    ("duration", "Duration (s)", "{:.1f}"),
+    ("nominal_srate", "Nominal (Hz)", "{:.1f}"),
+    ("effective_srate", "Effective (Hz)", "{:.2f}"),
+    ("n_gaps", "Gaps", "{}"),
+    ("loss", "Loss (%)", "{:.2f}"),
+    ("jitter", "Jitter (ms)", "{:.2f}"),
+    ("flat", "Flat", "{}"),
+    ("railed", "Railed", "{}"),
+    ("noise", "Noise", "{}"),
+]
+
+
+def file_hash(path, block_size=2**20):
+    """SHA-256 of the content of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stream_qc(stream, flat_threshold=1e-6, railed_threshold=0.01):
+    """Quality metrics of one stream (as returned by pyxdf).
+
+    "effective_srate" -- number of samples per second, between the first and last sample
+    "n_gaps", "loss" -- number of gaps and percentage of lost samples (estimated from the
+                        timestamps, see dejitter.sample_indices)
+    "jitter" -- standard deviation of the timestamps around a linear clock fit (in ms)
+    "flat" -- channels whose standard deviation is below ``flat_threshold``
+    "railed" -- channels at the limits of the output range of the device (see ``CODE_LIMITS``)
+                for more than ``railed_threshold`` of the samples (for other stream types, at
+                their own minimum or maximum)
+    "noise" -- per-channel noise, estimated as the robust (MAD-based) standard deviation of the
+               first difference of the signal
+    """
+    info = stream["info"]
+    stype = info["type"][0]
+    timestamps = np.asarray(stream["time_stamps"], dtype=np.float64)
+    qc = {
+        "name": info["name"][0],
+        "type": stype,
+        "source_id": info["source_id"][0],
+        "n_samples": len(timestamps),
+        "nominal_srate": float(info["nominal_srate"][0]),
+        "duration": float(timestamps[-1] - timestamps[0]) if len(timestamps) > 1 else 0.0,
+    }
+    if len(timestamps) < 3 or qc["nominal_srate"] <= 0 or info["channel_format"][0] == "string":
+        return qc
+
+    sfreq = qc["nominal_srate"]
+    qc["effective_srate"] = (len(timestamps) - 1) / qc["duration"]
+
+    frame_size = STREAMS.get(stype, {}).get("frame_size", 1)
+    idxs, offset, period = fit_clock(timestamps, sfreq, frame_size)
+    steps = np.diff(idxs)
+    qc["n_gaps"] = int(np.sum(steps > 1))
+    qc["loss"] = 100 * float(np.sum(steps - 1)) / (idxs[-1] + 1)
+    # Only the last sample of each packet carries timing information
+    last = np.append(np.diff(timestamps) != 0, True)
+    qc["jitter"] = 1000 * float(np.std(timestamps[last] - (offset + period * idxs[last])))
+
+    data = np.asarray(stream["time_series"], dtype=np.float64)
+    ch_names = _channel_names(info, data.shape[1])
+    std = data.std(axis=0)
+    if stype in CODE_LIMITS:
+        scale, offset = SCALES[stype]
+        low, high = (scale * (code - offset) for code in CODE_LIMITS[stype])
+        # Within half a code (values may have been rounded, e.g., to float32)
+        at_bounds = np.mean((data <= low + scale / 2) | (data >= high - scale / 2), axis=0)
+    else:
+        at_bounds = np.mean((data == data.min(axis=0)) | (data == data.max(axis=0)), axis=0)
+    diffs = np.diff(data, axis=0)
+    noise = 1.4826 * np.median(np.abs(diffs - np.median(diffs, axis=0)), axis=0)
+    qc["flat"] = [ch for ch, s in zip(ch_names, std) if s < flat_threshold]
+    railed = (at_bounds > railed_threshold) & (std >= flat_threshold)
+    qc["railed"] = [ch for ch, r in zip(ch_names, railed) if r]
+    qc["noise"] = {ch: float(n) for ch, n in zip(ch_names, noise)}
+    return qc
+
+
+def _channel_names(info, n_channels):
+    try:
+        channels = info["desc"][0]["channels"][0]["channel"]
+        return [channel["label"][0] for channel in channels]
+    except (IndexError, KeyError, TypeError):
+        return [str(i) for i in range(n_channels)]
+
+
+def file_qc(path):
+    """Quality metrics of all streams of an XDF file."""
+    streams, _ = load_xdf(path, dejitter_timestamps=False)
+    return [stream_qc(stream) for stream in streams]
+
+
+def run_qc(paths, cache=".qc_cache.json", n_jobs=None):
+    """Compute the quality metrics of XDF files, in parallel (one process per file).
+
+    Results are cached (in the JSON file ``cache``) by hash of the file content, so that only
+    new or modified files are processed. Returns {path: list of stream metrics}.
+    """
+    cached = {}
+    if cache is not None and os.path.exists(cache):
+        with open(cache) as f:
+            cached = json.load(f)
+
+    hashes = {path: file_hash(path) for path in paths}
+    todo = [path for path in paths if hashes[path] not in cached]
+    print(f"{len(paths) - len(todo)} files in cache, processing {len(todo)} files...")
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            for path, result in zip(todo, executor.map(file_qc, todo)):
+                cached[hashes[path]] = result
+
+    if cache is not None:
+        with open(cache, "w") as f:
+            json.dump(cached, f)
+    return {path: cached[hashes[path]] for path in paths}
+
+
+def _rows(results):
+    for path, streams in results.items():
+        for qc in streams:
+            row = [os.path.basename(path)]
+            for key, _, fmt in COLUMNS:
+                value = qc.get(key)
+                if value is None:
+                    row.append("")
+                elif key == "noise":
+                    row.append(", ".join(f"{ch}: {n:.2f}" for ch, n in value.items()))
+                elif isinstance(value, list):
+                    row.append(", ".join(value))
+                else:
+                    row.append(fmt.format(value))
+            yield row
+
+
+def print_table(results):
+    """Print the summary table of ``run_qc`` results."""
+    header = ["File"] + [title for _, title, _ in COLUMNS[:-1]]
+    rows = [row[:-1] for row in _rows(results)]  # Noise is only in the HTML report
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)))
+
+
+def write_report(results, path="qc_report.html"):
+    """Write the summary table of ``run_qc`` results as an HTML page."""
+    header = ["File"] + [title for _, title, _ in COLUMNS]
+    lines = [
+        "<!DOCTYPE html>",
+        "<html><head><meta charset='utf-8'><title>MuseLSL2 QC report</title>",
+        "<style>table {border-collapse: collapse} td, th {border: 1px solid #ccc; padding: 4px}",
+        ".warning {background: #fdd}</style></head><body>",
+        "<h1>MuseLSL2 QC report</h1>",
+        "<table>",
+        "<tr>" + "".join(f"<th>{html.escape(h)}</th>" for h in header) + "</tr>",
+    ]
+    flagged = [header.index(title) for title in ["Flat", "Railed"]]
+    for row in _rows(results):
+        cells = []
+        for i, cell in enumerate(row):
+            warning = " class='warning'" if i in flagged and cell else ""
+            cells.append(f"<td{warning}>{html.escape(str(cell))}</td>")
+        lines.append("<tr>" + "".join(cells) + "</tr>")
+    lines += ["</table>", "</body></html>"]
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    return path
+
+
+def qc(
+    pattern="data/sub-*/ses-*/eeg/*.xdf", report="qc_report.html", cache=".qc_cache.json", n_jobs=None
+):
+    """Run the QC of all files matching ``pattern``, print the table and write the report."""
+    paths = sorted(glob.glob(pattern, recursive=True))
+    if len(paths) == 0:
+        raise RuntimeError(f"No file matching '{pattern}'.")
+
+    results = run_qc(paths, cache, n_jobs)
+    print_table(results)
+    print(f"Report written to {write_report(results, report)}")
+    return results
@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import mne_lsl.lsl
+import numpy as np
+
+from .stream import STREAMS, make_outlet
+from .xdf import load_xdf
+
+
+def load_session(path):
+    """Load the Muse streams (EEG, PPG, ACC, GYRO) of an XDF file, for replay.
+
+    Returns the address of the device (from the ``source_id`` of the streams, or the file name)
+    and {stype: (data, times, ch_names)}, with data of shape (n_samples, n_channels) in float32
+    and times in seconds from the start of the session.
+    """
+    streams, _ = load_xdf(path)
+    address = os.path.splitext(os.path.basename(path))[0]
+    session = {}
+    for stream in streams:
+        info = stream["info"]
+        stype = info["type"][0]
+        if stype not in STREAMS or len(stream["time_stamps"]) == 0:
+            continue
+        source_id = info["source_id"][0]
+        if source_id.startswith("Muse_"):
+            address = source_id[len("Muse_") :]
+        data = np.ascontiguousarray(stream["time_series"], dtype=np.float32)
+        ch_names = None
+        if stype == "EEG":
+            try:
+                channels = info["desc"][0]["channels"][0]["channel"]
+                ch_names = [channel["label"][0] for channel in channels]
+            except (IndexError, KeyError, TypeError):
+                pass
+            if ch_names is None or len(ch_names) != data.shape[1]:
+                ch_names = STREAMS["EEG"]["ch_names"][: data.shape[1]]
+        session[stype] = (data, np.asarray(stream["time_stamps"], dtype=np.float64), ch_names)
+
+    if session:
+        start = min(times[0] for _, times, _ in session.values())
+        session = {stype: (data, times - start, ch) for stype, (data, times, ch) in session.items()}
+    return address, session
+
+
+class _Track:
+    """One recorded stream, pushed to its outlet."""
+
+    def __init__(self, outlet, data, times):
+        self.outlet = outlet
+        self.data = data
+        self.times = times
+        self.cursor = 0
+
+    @property
+    def done(self):
+        return self.cursor == len(self.times)
+
+    def push(self, position, origin, speed):
+        """Push the samples recorded up to ``position`` (in seconds from the start of the session).
+
+        Each sample is stamped ``origin`` (LSL time of the start of the session) plus its time
+        in the recording divided by ``speed`` (not divided if the speed is 0, so that the
+        timestamps keep the recorded spacing, ahead of the clock).
+        """
+        stop = int(np.searchsorted(self.times, position, side="right"))
+        if stop <= self.cursor:
+            return 0
+        timestamps = origin + self.times[self.cursor : stop] / (speed or 1.0)
+        if stop - self.cursor == 1:
+            self.outlet.push_sample(self.data[self.cursor], timestamps[0])
+        else:
+            self.outlet.push_chunk(self.data[self.cursor : stop], timestamps)
+        n_samples = stop - self.cursor
+        self.cursor = stop
+        return n_samples
+
+
+def replay(paths, speed=1.0, loop=False, interval=0.02, n_jobs=None, stop=None):
+    """Re-publish the Muse streams of recorded XDF sessions as live LSL outlets.
+
+    The outlets have the same names, types, channels and ``source_id`` as those created by
+    ``stream()``. Sessions recorded with the same device get distinct addresses (with a "-2",
+    "-3"... suffix), so that each file appears as a separate headset. The files are preloaded
+    (in parallel), start together and are replayed from a single thread which pushes, every
+    ``interval`` seconds, the samples that are due (one chunk per stream). Timestamps are those
+    of the recording, mapped to the current time (and compressed by ``speed``, see
+    ``_Track.push``).
+
+    speed -- replay speed, relative to the recording (0 to push as fast as possible, one second
+             of recording per push)
+    loop -- restart the sessions from the beginning when they end
+    stop -- threading.Event to stop the replay (otherwise, until CTRL + C or the end)
+    """
+    paths = list(paths)
+    if len(paths) == 0:
+        raise ValueError("No file to replay.")
+
+    print(f"Loading {len(paths)} files...")
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        sessions = list(executor.map(load_session, paths))
+
+    tracks = []
+    seen = {}
+    for path, (address, session) in zip(paths, sessions):
+        if not session:
+            print(f"No Muse stream in {path}. Skipping.")
+            continue
+        seen[address] = seen.get(address, 0) + 1
+        if seen[address] > 1:
+            address = f"{address}-{seen[address]}"
+        for stype, (data, times, ch_names) in session.items():
+            tracks.append(_Track(make_outlet(stype, address, ch_names), data, times))
+        print(f"Replaying {path} as Muse_{address} ({', '.join(session)}).")
+    if not tracks:
+        raise RuntimeError("No Muse stream to replay.")
+
+    stop = stop or threading.Event()
+    n_samples = 0
+    position = 0.0
+    end = max(track.times[-1] for track in tracks)
+    origin = mne_lsl.lsl.local_clock()
+    start = t0 = time.perf_counter()
+    print(f"Streaming {len(tracks)} streams at {f'{speed:g}x' if speed else 'max'} speed...")
+    try:
+        while not stop.is_set():
+            position = (time.perf_counter() - t0) * speed if speed else position + 1.0
+            for track in tracks:
+                n_samples += track.push(position, origin, speed)
+
+            if all(track.done for track in tracks):
+                if not loop:
+                    break
+                for track in tracks:
+                    track.cursor = 0
+                position = 0.0
+                # After the last timestamps (ahead of the clock at max speed)
+                origin = max(mne_lsl.lsl.local_clock(), origin + end / (speed or 1.0) + interval)
+                t0 = time.perf_counter()
+            if speed:
+                stop.wait(interval)
+    except KeyboardInterrupt:
+        print("Replay interrupted.")
+
+    elapsed = time.perf_counter() - start
+    print(f"Pushed {n_samples} samples in {elapsed:.1f} s ({n_samples / elapsed:.0f} samples/s).")
+    return n_samples
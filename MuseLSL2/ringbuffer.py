@@ -0,0 +1,150 @@
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+_HEADER = 4  # int64 fields: count, capacity, n_channels, count after the ongoing write
+
+
+class RingBuffer:
+    """Ring buffer of multichannel samples and their timestamps.
+
+    Every sample is written twice (at positions ``i`` and ``i + capacity``), so that any window of
+    up to ``capacity`` samples is contiguous in memory and can be returned as a NumPy view.
+
+    The buffer can live in any writable buffer (e.g., shared memory or a memory-mapped file).
+    A single writer can be read by any number of readers, each keeping track of its own position
+    (the total number of samples written, ``count``, is stored in the header).
+    """
+
+    def __init__(self, n_channels, capacity, buffer=None, dtype=np.float64):
+        if buffer is None:
+            buffer = bytearray(self.nbytes(n_channels, capacity, dtype))
+        self.buffer = buffer
+        self.n_channels = n_channels
+        self.capacity = capacity
+
+        offset = _HEADER * 8
+        self._header = np.ndarray(_HEADER, dtype=np.int64, buffer=buffer)
+        self.timestamps = np.ndarray(2 * capacity, dtype=np.float64, buffer=buffer, offset=offset)
+        offset += self.timestamps.nbytes
+        self.data = np.ndarray((2 * capacity, n_channels), dtype=dtype, buffer=buffer, offset=offset)
+
+        if self._header[1] == 0:  # new buffer
+            self._header[:] = [0, capacity, n_channels, 0]
+
+    @staticmethod
+    def nbytes(n_channels, capacity, dtype=np.float64):
+        """Size (in bytes) of the buffer needed to store a ring."""
+        return 8 * _HEADER + 2 * capacity * (8 + n_channels * np.dtype(dtype).itemsize)
+
+    @classmethod
+    def from_buffer(cls, buffer, dtype=np.float64):
+        """Attach to an existing ring (the dimensions are read from its header)."""
+        header = np.ndarray(_HEADER, dtype=np.int64, buffer=buffer)
+        return cls(int(header[2]), int(header[1]), buffer=buffer, dtype=dtype)
+
+    @property
+    def count(self):
+        """Total number of samples written since the creation of the ring."""
+        return int(self._header[0])
+
+    def reset(self):
+        self._header[0] = 0
+
+    def write(self, data, timestamps):
+        """Append samples (array of shape (n_samples, n_channels)) and their timestamps."""
+        count = self.count
+        n = len(timestamps)
+        if n > self.capacity:  # only the most recent samples fit
+            data = data[-self.capacity :]
+            timestamps = timestamps[-self.capacity :]
+            count += n - self.capacity
+            n = self.capacity
+
+        # Announce the write, so that readers can detect samples being overwritten
+        self._header[3] = count + n
+
+        start = count % self.capacity
+        first = min(n, self.capacity - start)
+        for offset in [0, self.capacity]:
+            self.data[offset + start : offset + start + first] = data[:first]
+            self.timestamps[offset + start : offset + start + first] = timestamps[:first]
+            self.data[offset : offset + n - first] = data[first:]
+            self.timestamps[offset : offset + n - first] = timestamps[first:]
+
+        # Update the count last, so that readers never see samples that are not written yet
+        self._header[0] = count + n
+
+    def read(self, start, stop=None):
+        """Return views (data, timestamps) of the samples ``start`` to ``stop`` (absolute indices).
+
+        Samples that were already overwritten are skipped. The views are only valid until the
+        writer wraps around; use ``copy()`` to read from another thread or process.
+        """
+        if stop is None:
+            stop = self.count
+        start = max(start, stop - self.capacity, 0)
+        end = stop % self.capacity + self.capacity
+        begin = end - max(stop - start, 0)
+        return self.data[begin:end], self.timestamps[begin:end]
+
+    def latest(self, n):
+        """Return views of the last ``n`` samples."""
+        count = self.count
+        return self.read(count - n, count)
+
+    def copy(self, start, stop=None):
+        """Return copies (data, timestamps, start) of the samples ``start`` to ``stop``.
+
+        Safe against a concurrent writer: samples that were overwritten during the copy are
+        dropped, and the absolute index of the first returned sample is returned.
+        """
+        if stop is None:
+            stop = self.count
+        start = max(start, stop - self.capacity, 0)
+        data, timestamps = self.read(start, stop)
+        data, timestamps = data.copy(), timestamps.copy()
+
+        # Drop what the writer may have overwritten in the meantime
+        overwritten = int(self._header[3]) - self.capacity - start
+        if overwritten > 0:
+            data, timestamps = data[overwritten:], timestamps[overwritten:]
+            start += overwritten
+        return data, timestamps, start
+
+
+class SharedRingBuffer(RingBuffer):
+    """Ring buffer in shared memory, that can be written and read from different processes.
+
+    The creator of the buffer (``create=True``) is responsible for calling ``unlink()``.
+    """
+
+    def __init__(self, name, n_channels=None, capacity=None, create=False):
+        if create:
+            size = self.nbytes(n_channels, capacity)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.shm.buf[: 8 * _HEADER] = bytes(8 * _HEADER)
+        else:
+            self.shm = _attach(name)
+            header = np.ndarray(_HEADER, dtype=np.int64, buffer=self.shm.buf)
+            capacity, n_channels = int(header[1]), int(header[2])
+        self.name = name
+        RingBuffer.__init__(self, n_channels, capacity, buffer=self.shm.buf)
+
+    def close(self):
+        # Release the views before closing the shared memory
+        del self._header, self.timestamps, self.data, self.buffer
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def _attach(name):
+    """Attach to an existing shared memory block without letting this process destroy it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
@@ -0,0 +1,116 @@
+from collections import deque
+
+import mne_lsl.lsl
+
+# Modalities shed under congestion, in this order (and restored in the reverse order)
+SHED_ORDER = ["GYRO", "ACC", "PPG"]
+
+
+class LoadShedder:
+    """Adaptive shedding of the lower-priority modalities of a Muse when packets are lost.
+
+    The EEG packet loss is measured over the last ``window`` seconds. When it stays above
+    ``shed_threshold`` (fraction of frames) for a whole window, the next modality of
+    ``SHED_ORDER`` is paused (its notifications are disabled on the device, see
+    ``Muse.pause_modality``). Shedding PPG also switches the device to ``lean_preset`` (without
+    PPG), if a preset was selected. When the loss stays below ``restore_threshold`` for
+    ``hold`` seconds, the last shed modality is restored. After each change, the loss is
+    measured again from scratch.
+
+    ``poll`` never blocks, so it can be called from the streaming loop (e.g., as a task of
+    ``supervise()``). Each change is printed, and pushed as a marker to ``outlet`` (if any, see
+    ``make_shedding_outlet``), e.g., "shed GYRO (EEG loss 7.5%)".
+    """
+
+    def __init__(
+        self,
+        outlet=None,
+        window=5,
+        shed_threshold=0.05,
+        restore_threshold=0.01,
+        hold=30,
+        lean_preset="p20",
+    ):
+        self.outlet = outlet
+        self.window = window
+        self.shed_threshold = shed_threshold
+        self.restore_threshold = restore_threshold
+        self.hold = hold
+        self.lean_preset = lean_preset
+        self.shed = []  # Shed modalities, in order
+        self._preset = None  # Preset before shedding PPG
+        self._history = deque()  # (time, frames, lost)
+        self._since = None  # Start of the current measurement
+        self._calm_since = None  # Since when the loss is below ``restore_threshold``
+
+    def loss(self, muse, now=None):
+        """EEG packet loss (fraction of frames) over the last ``window`` seconds."""
+        if now is None:
+            now = mne_lsl.lsl.local_clock()
+        self._history.append((now, muse.n_frames["EEG"], muse.n_lost["EEG"]))
+        while len(self._history) > 2 and self._history[1][0] <= now - self.window:
+            self._history.popleft()
+        _, frames, lost = self._history[0]
+        frames = muse.n_frames["EEG"] - frames
+        lost = muse.n_lost["EEG"] - lost
+        return lost / (frames + lost) if frames + lost > 0 else 0.0
+
+    def poll(self, muse):
+        now = mne_lsl.lsl.local_clock()
+        if self._since is None:
+            self._reset(now)
+        loss = self.loss(muse, now)
+        if loss >= self.restore_threshold:
+            self._calm_since = now
+
+        if loss > self.shed_threshold and now - self._since >= self.window:
+            candidates = [stype for stype in SHED_ORDER if stype in muse.modalities]
+            if candidates:
+                self._shed(muse, candidates[0], loss)
+                self._reset(now)
+        elif self.shed and now - self._calm_since >= self.hold:
+            self._restore(muse, self.shed[-1], loss)
+            self._reset(now)
+
+    def _reset(self, now):
+        self._history.clear()
+        self._since = self._calm_since = now
+
+    def _shed(self, muse, stype, loss):
+        muse.pause_modality(stype)
+        if stype == "PPG" and muse.preset is not None and self.lean_preset is not None:
+            self._preset = muse.preset
+            muse.change_preset(self.lean_preset)
+        self.shed.append(stype)
+        self._announce(f"shed {stype} (EEG loss {100 * loss:.1f}%)")
+
+    def _restore(self, muse, stype, loss):
+        if stype == "PPG" and self._preset is not None:
+            muse.change_preset(self._preset)
+            self._preset = None
+        muse.resume_modality(stype)
+        self.shed.remove(stype)
+        self._announce(f"restore {stype} (EEG loss {100 * loss:.1f}%)")
+
+    def _announce(self, message):
+        print(f"Load shedding: {message}.")
+        if self.outlet is not None:
+            self.outlet.push_sample([message])
+
+
+def make_shedding_outlet(address):
+    """Create the 'SHEDDING' outlet, announcing the changes of the streamed modalities.
+
+    It is not of type "Markers", so that it is not mistaken for experimental events.
+    """
+    info = mne_lsl.lsl.StreamInfo(
+        "MuseLoadShedding",
+        stype="SHEDDING",
+        n_channels=1,
+        sfreq=0,
+        dtype="string",
+        source_id=f"Muse_{address}_shedding",
+    )
+    info.desc.append_child_value("manufacturer", "Muse")
+    info.desc.append_child_value("order", ",".join(SHED_ORDER))
+    return mne_lsl.lsl.StreamOutlet(info)
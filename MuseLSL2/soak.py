@@ -0,0 +1,255 @@
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from .diagnostics import HANDLERS, Histogram
+from .stream import STREAMS
+
+
+def rss():
+    """Resident memory of the process, in bytes (NaN if it can't be measured)."""
+    try:
+        import psutil
+
+        return float(psutil.Process().memory_info().rss)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return float(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+
+        # Peak (not current) resident memory, in kB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return float(peak if sys.platform == "darwin" else peak * 1024)
+    except ImportError:
+        return np.nan
+
+
+class Soak:
+    """Long-running health sampling of the streaming process, written to a JSON-lines file.
+
+    Every ``interval`` seconds (call ``sample`` from the streaming loop, e.g., as a task of
+    ``supervise()``), one line is appended to ``path`` with:
+    "session" -- seconds of EEG received since the start (from ``counter("EEG")``), which is
+                 the session time even if a synthetic device doesn't keep up with its speed
+    "rss" -- resident memory (bytes)
+    "gc" -- number of collections and total and maximal pause (seconds) per generation, since
+            the previous line, and current allocation counts (``gc.get_count()``)
+    "rates" -- calls and samples per second of each modality (see ``counter``)
+    "latency" -- median and 99th percentile of the handler latency (with ``diagnostics``), over
+                 the interval if ``reset_diagnostics`` (otherwise, since the start)
+    "top" -- every ``snapshot_every`` lines, the ``top`` source lines whose allocated memory
+             grew most since the start (tracemalloc, with ``frames`` frames per allocation)
+
+    The first line describes the session (``meta``) and ``stop()`` appends (and prints) a
+    summary: memory growth rate, GC pauses, latency drift and the largest allocation growths.
+    Tracing the allocations slows down the process (about 3 times): with ``top=0``, they are
+    not traced.
+    """
+
+    def __init__(
+        self,
+        path,
+        interval=60,
+        diagnostics=None,
+        reset_diagnostics=False,
+        top=10,
+        snapshot_every=10,
+        frames=1,
+        meta=None,
+    ):
+        self.path = path
+        self.interval = interval
+        self.diagnostics = diagnostics
+        self.reset_diagnostics = reset_diagnostics
+        self.top = top
+        self.snapshot_every = snapshot_every
+        self.frames = frames
+        self.meta = meta or {}
+        self.counts = {}  # stype -> [calls, samples]
+        self.records = []
+        self._pauses = [Histogram() for _ in range(3)]
+        self._gc_start = None
+        self._file = None
+        self._baseline = None
+        self._t0 = self._last_sample = None
+        self._last_counts = {}
+        self._eeg_start = 0
+        self._n_samples = 0
+
+    def counter(self, stype):
+        """Data callback counting the calls and samples of a modality, function(data, timestamps)."""
+        counts = self.counts.setdefault(stype, [0, 0])
+
+        def count(data, timestamps):
+            counts[0] += 1
+            counts[1] += len(timestamps)
+
+        return count
+
+    def start(self):
+        if self.top > 0:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            self._baseline = tracemalloc.take_snapshot()
+        gc.callbacks.append(self._on_gc)
+        self._file = open(self.path, "w")
+        self._write({"meta": {"start": time.time(), "interval": self.interval, **self.meta}})
+        self._t0 = self._last_sample = time.perf_counter()
+        self._last_counts = {stype: list(counts) for stype, counts in self.counts.items()}
+        self._eeg_start = self.counts.get("EEG", [0, 0])[1]
+
+    def stop(self):
+        if self._file is None:
+            return
+        # Last line (unless the previous one is recent, as rates over a short time are noisy)
+        if not self.records or time.perf_counter() - self._last_sample >= self.interval / 2:
+            self.sample(force=True)
+        gc.callbacks.remove(self._on_gc)
+        summary = self.summary()
+        if self._baseline is not None:
+            summary["top_growth"] = self._top_growth()[:5]
+            tracemalloc.stop()
+            self._baseline = None
+        self._write({"summary": summary})
+        self._file.close()
+        self._file = None
+        print_summary(summary)
+        return summary
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            self._pauses[info["generation"]].add(time.perf_counter() - self._gc_start)
+            self._gc_start = None
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def sample(self, force=False):
+        """Append a line to the file, if ``interval`` seconds have passed since the previous one."""
+        now = time.perf_counter()
+        elapsed = now - self._last_sample
+        if self._file is None or (elapsed < self.interval and not force) or elapsed <= 0:
+            return
+
+        record = {"t": round(now - self._t0, 3)}
+        if "EEG" in self.counts:
+            record["session"] = (self.counts["EEG"][1] - self._eeg_start) / STREAMS["EEG"]["sfreq"]
+        record["rss"] = rss()
+        record["gc"] = {
+            "count": list(gc.get_count()),
+            "collections": [pauses.n for pauses in self._pauses],
+            "pause": [pauses.total for pauses in self._pauses],
+            "max_pause": [pauses.max for pauses in self._pauses],
+        }
+        for pauses in self._pauses:
+            pauses.reset()
+
+        record["rates"] = {}
+        for stype, (calls, samples) in self.counts.items():
+            last_calls, last_samples = self._last_counts.get(stype, (0, 0))
+            record["rates"][stype] = [(calls - last_calls) / elapsed, (samples - last_samples) / elapsed]
+            self._last_counts[stype] = [calls, samples]
+
+        if self.diagnostics is not None:
+            histograms = self.diagnostics.histograms
+            record["latency"] = {
+                h: [histograms[h]["latency"].percentile(q) for q in [50, 99]]
+                for h in HANDLERS
+                if histograms[h]["latency"].n > 0
+            }
+            if self.reset_diagnostics:
+                self.diagnostics.reset()
+
+        self._n_samples += 1
+        if self._baseline is not None and self._n_samples % self.snapshot_every == 0:
+            record["top"] = self._top_growth()
+
+        self.records.append(record)
+        self._write(record)
+        self._last_sample = now
+
+    def _top_growth(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        )
+        stats = snapshot.compare_to(self._baseline, "lineno")
+        return [
+            [str(stat.traceback[0]), stat.size, stat.size_diff, stat.count_diff]
+            for stat in stats[: self.top]
+        ]
+
+    def summary(self):
+        """Summary of the recorded lines (see ``summarize``)."""
+        return summarize(self.records, self.meta.get("speed", 1.0))
+
+
+def summarize(records, speed=1.0):
+    """Summary of soak records: duration, memory growth, GC pauses and latency drift.
+
+    The growth rate of the resident memory is the slope of a linear fit (in MB per hour of
+    session, i.e., of EEG received, or of wall-clock time times ``speed`` without EEG counts).
+    """
+    records = [record for record in records if "t" in record]
+    if not records:
+        return {}
+    t = np.array([record["t"] for record in records])
+    session = np.array([record.get("session", record["t"] * speed) for record in records]) / 3600
+    memory = np.array([record["rss"] for record in records]) / 2**20
+    summary = {
+        "duration": float(t[-1]),
+        "session_hours": float(session[-1]),
+        "rss_start_mb": float(memory[0]),
+        "rss_end_mb": float(memory[-1]),
+        "rss_max_mb": float(np.nanmax(memory)),
+    }
+    if len(t) > 2 and np.ptp(session) > 0:
+        slope = np.polyfit(session, memory, 1)[0]
+        summary["rss_growth_mb_per_hour"] = float(slope)
+
+    pauses = np.array([record["gc"]["pause"] for record in records])
+    summary["gc_collections"] = np.sum([record["gc"]["collections"] for record in records], axis=0).tolist()
+    summary["gc_pause_total"] = pauses.sum(axis=0).tolist()
+    summary["gc_pause_max"] = np.max([record["gc"]["max_pause"] for record in records], axis=0).tolist()
+
+    latencies = [record["latency"] for record in records if record.get("latency")]
+    if len(latencies) > 1:
+        summary["latency_p99"] = {
+            h: [latencies[0][h][1], latencies[-1][h][1]] for h in latencies[-1] if h in latencies[0]
+        }
+    return summary
+
+
+def print_summary(summary):
+    if not summary:
+        print("Soak: no sample recorded.")
+        return
+    print(f"Soak: {summary['duration']:.0f} s ({summary['session_hours']:.1f} h of session)")
+    print(
+        f"  RSS: {summary['rss_start_mb']:.1f} -> {summary['rss_end_mb']:.1f} MB "
+        f"(max {summary['rss_max_mb']:.1f} MB)",
+        end="",
+    )
+    if "rss_growth_mb_per_hour" in summary:
+        print(f", growth {summary['rss_growth_mb_per_hour']:+.2f} MB/h", end="")
+    print()
+    print(
+        f"  GC: {summary['gc_collections']} collections (gen 0/1/2), "
+        f"max pause {1000 * max(summary['gc_pause_max']):.2f} ms"
+    )
+    for handler, (first, last) in summary.get("latency_p99", {}).items():
+        print(f"  {handler} latency p99: {1000 * first:.2f} -> {1000 * last:.2f} ms")
+    for location, size, size_diff, _ in summary.get("top_growth", []):
+        print(f"  {size_diff / 1024:+.1f} kB ({size / 1024:.1f} kB) {location}")
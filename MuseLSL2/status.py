@@ -0,0 +1,69 @@
+import mne_lsl.lsl
+import numpy as np
+
+STATUS_CHANNELS = [
+    ("battery", "percent"),  # From the control status
+    ("telemetry_battery", "percent"),
+    ("fuel_gauge", "mV"),
+    ("adc_volt", "mV"),
+    ("temperature", "celsius"),
+]
+
+
+class StatusMonitor:
+    """Background polling of the device status, published on a 'STATUS' outlet.
+
+    The battery level is requested every ``interval`` seconds with ``Muse.ask_control()``, and
+    telemetry packets are received with ``telemetry`` (to pass as ``callback_telemetry``).
+    ``poll`` never waits for the device, so it can be called from the streaming loop (e.g., as
+    a task of ``supervise()``). A sample is pushed each time new values are received (NaN for
+    the values not received yet).
+    """
+
+    def __init__(self, outlet, interval=60):
+        self.outlet = outlet
+        self.interval = interval
+        self.values = np.full(len(STATUS_CHANNELS), np.nan, dtype=np.float32)
+        self._future = None
+        self._last_request = -np.inf
+
+    def poll(self, muse):
+        muse.expire_requests()
+        if self._future is not None and self._future.done():
+            try:
+                response = self._future.result()
+                self.values[0] = response.get("bp", np.nan)
+                self._publish()
+            except Exception as e:
+                print(f"Status request failed ({e}).")
+            self._future = None
+
+        now = mne_lsl.lsl.local_clock()
+        if self._future is None and now - self._last_request >= self.interval:
+            self._future = muse.ask_control()
+            self._last_request = now
+
+    def telemetry(self, timestamp, battery, fuel_gauge, adc_volt, temperature):
+        self.values[1:] = [battery, fuel_gauge, adc_volt, temperature]
+        self._publish(timestamp)
+
+    def _publish(self, timestamp=None):
+        if timestamp is None:
+            timestamp = mne_lsl.lsl.local_clock()
+        self.outlet.push_sample(self.values, timestamp)
+
+
+def make_status_outlet(address):
+    """Create the 'STATUS' outlet (battery and telemetry of the device)."""
+    info = mne_lsl.lsl.StreamInfo(
+        "Muse",
+        stype="STATUS",
+        n_channels=len(STATUS_CHANNELS),
+        sfreq=0,
+        dtype="float32",
+        source_id=f"Muse_{address}_status",
+    )
+    info.desc.append_child_value("manufacturer", "Muse")
+    info.set_channel_names([name for name, _ in STATUS_CHANNELS])
+    info.set_channel_units([unit for _, unit in STATUS_CHANNELS])
+    return mne_lsl.lsl.StreamOutlet(info)
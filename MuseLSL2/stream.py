@@ -1,13 +1,131 @@
+import threading
+import time
 from functools import partial
 
 import mne_lsl.lsl
 
 from . import backends
+from .diagnostics import Diagnostics
 from .muse import Muse
 
 
+# Description of the LSL streams created for each modality
+STREAMS = {
+    "EEG": {
+        "n_channels": 5,
+        "sfreq": 256,
+        "ch_names": ["TP9", "AF7", "AF8", "TP10", "AUX"],
+        "ch_type": "eeg",
+        "units": "microvolts",
+        "chunk_size": 6,
+        "frame_size": 12,  # Samples per BLE packet
+    },
+    # PPG data has three channels: ambient, infrared, red
+    "PPG": {
+        "n_channels": 3,
+        "sfreq": 64,
+        "ch_names": ["LUX", "IR", "RED"],
+        "ch_type": "ppg",
+        "units": "mmHg",
+        "chunk_size": 1,
+        "frame_size": 6,
+    },
+    "ACC": {
+        "n_channels": 3,
+        "sfreq": 52,
+        "ch_names": ["ACC_X", "ACC_Y", "ACC_Z"],
+        "ch_type": "accelerometer",
+        "units": "g",
+        "chunk_size": 1,
+        "frame_size": 3,
+    },
+    "GYRO": {
+        "n_channels": 3,
+        "sfreq": 52,
+        "ch_names": ["GYRO_X", "GYRO_Y", "GYRO_Z"],
+        "ch_type": "gyroscope",
+        "units": "dps",
+        "chunk_size": 1,
+        "frame_size": 3,
+    },
+}
+
+
+def channel_names(stype, channels=None):
+    """Names of the channels of a modality, restricted to the selected EEG ``channels``."""
+    if stype == "EEG" and channels is not None:
+        return list(channels)
+    return STREAMS[stype]["ch_names"]
+
+
+def make_outlet(stype, address, channels=None):
+    """Create the LSL outlet of a modality ("EEG", "PPG", "ACC" or "GYRO")."""
+    spec = STREAMS[stype]
+    ch_names = channel_names(stype, channels)
+    info = mne_lsl.lsl.StreamInfo(
+        "Muse",
+        stype=stype,
+        n_channels=len(ch_names),
+        sfreq=spec["sfreq"],
+        dtype="float32",
+        source_id=f"Muse_{address}",
+    )
+    info.desc.append_child_value("manufacturer", "Muse")
+    info.set_channel_names(ch_names)
+    info.set_channel_types([spec["ch_type"]] * len(ch_names))
+    info.set_channel_units(spec["units"])
+
+    return mne_lsl.lsl.StreamOutlet(info, chunk_size=spec["chunk_size"])
+
+
 # Begins LSL stream(s) from a Muse with a given address with data sources determined by arguments
-def stream(address, ppg=True, acc=True, gyro=True, preset=None):
+def stream(
+    address,
+    ppg=True,
+    acc=True,
+    gyro=True,
+    preset=None,
+    diagnostics=False,
+    stall_timeout=5,
+    keep_alive_interval=10,
+    max_retries=10,
+    isolated=False,
+    merged=False,
+    channels=None,
+    pipelines=None,
+    artifacts=False,
+    backend=None,
+    duration=None,
+    status=False,
+    decimate=None,
+    flight=None,
+    flight_minutes=10,
+    load_shedding=False,
+    soak=None,
+    soak_interval=60,
+    soak_top=10,
+    stop=None,
+):
+    if isolated:
+        # The dedicated process only streams the raw modalities
+        options = {
+            "merged": merged,
+            "artifacts": artifacts,
+            "diagnostics": diagnostics,
+            "pipelines": pipelines,
+            "status": status,
+            "decimate": decimate,
+            "flight": flight,
+            "load_shedding": load_shedding,
+            "soak": soak,
+            "backend": backend,
+            "duration": duration,
+            "stop": stop,
+        }
+        enabled = [name for name, value in options.items() if value]
+        if enabled:
+            raise ValueError(f"Can't combine the isolated mode with: {', '.join(enabled)}.")
+
     # Find device
     if not address:
         from .find import find_devices
@@ -15,89 +133,113 @@ def stream(address, ppg=True, acc=True, gyro=True, preset=None):
         device = find_devices(max_duration=10, verbose=True)[0]
         address = device["address"]
 
-    # EEG ====================================================
-    eeg_info = mne_lsl.lsl.StreamInfo(
-        "Muse",
-        stype="EEG",
-        n_channels=5,
-        sfreq=256,
-        dtype="float32",
-        source_id=f"Muse_{address}",
-    )
-    eeg_info.desc.append_child_value("manufacturer", "Muse")
-    eeg_info.set_channel_names(["TP9", "AF7", "AF8", "TP10", "AUX"])
-    eeg_info.set_channel_types(["eeg"] * 5)
-    eeg_info.set_channel_units("microvolts")
-
-    eeg_outlet = mne_lsl.lsl.StreamOutlet(eeg_info, chunk_size=6)
-
-    # PPG ====================================================
-    if ppg is True:
-        ppg_info = mne_lsl.lsl.StreamInfo(
-            "Muse",
-            stype="PPG",
-            n_channels=3,
-            sfreq=64,
-            dtype="float32",
-            source_id=f"Muse_{address}",
-        )
-        ppg_info.desc.append_child_value("manufacturer", "Muse")
-        # PPG data has three channels: ambient, infrared, red
-        ppg_info.set_channel_names(["LUX", "IR", "RED"])
-        ppg_info.set_channel_types(["ppg"] * 3)
-        ppg_info.set_channel_units("mmHg")
-
-        ppg_outlet = mne_lsl.lsl.StreamOutlet(ppg_info, chunk_size=1)
-
-    # ACC ====================================================
-    if acc:
-        acc_info = mne_lsl.lsl.StreamInfo(
-            "Muse",
-            stype="ACC",
-            n_channels=3,
-            sfreq=52,
-            dtype="float32",
-            source_id=f"Muse_{address}",
-        )
-        acc_info.desc.append_child_value("manufacturer", "Muse")
-        acc_info.set_channel_names(["ACC_X", "ACC_Y", "ACC_Z"])
-        acc_info.set_channel_types(["accelerometer"] * 3)
-        acc_info.set_channel_units("g")
-
-        acc_outlet = mne_lsl.lsl.StreamOutlet(acc_info, chunk_size=1)
-
-    # GYRO ====================================================
-    if gyro:
-        gyro_info = mne_lsl.lsl.StreamInfo(
-            "Muse",
-            stype="GYRO",
-            n_channels=3,
-            sfreq=52,
-            dtype="float32",
-            source_id=f"Muse_{address}",
-        )
-        gyro_info.desc.append_child_value("manufacturer", "Muse")
-        gyro_info.set_channel_names(["GYRO_X", "GYRO_Y", "GYRO_Z"])
-        gyro_info.set_channel_types(["gyroscope"] * 3)
-        gyro_info.set_channel_units("dps")
-
-        gyro_outlet = mne_lsl.lsl.StreamOutlet(gyro_info, chunk_size=1)
-
-    def push(data, timestamps, outlet):
-        outlet.push_chunk(data.T, timestamps[-1])
-
-    push_eeg = partial(push, outlet=eeg_outlet)
-    push_ppg = partial(push, outlet=ppg_outlet) if ppg else None
-    push_acc = partial(push, outlet=acc_outlet) if acc else None
-    push_gyro = partial(push, outlet=gyro_outlet) if gyro else None
+    modalities = ["EEG"] + [m for m, enabled in [("PPG", ppg), ("ACC", acc), ("GYRO", gyro)] if enabled]
+
+    # Acquisition in a dedicated process, pushing from this one
+    if isolated:
+        from .acquisition import stream_isolated
+
+        return stream_isolated(address, modalities, preset, stall_timeout, max_retries, channels)
+
+    # Functions receiving the frames of each modality, function(data, timestamps)
+    outlets = {stype: make_outlet(stype, address, channels) for stype in modalities}
+    consumers = {stype: [partial(push, outlet=outlet)] for stype, outlet in outlets.items()}
+
+    # MERGED ====================================================
+    merger = None
+    if merged:
+        from .merge import Merger, make_merged_outlet
+
+        merger = Merger(make_merged_outlet(address, modalities, channels), modalities, channels)
+        for stype in modalities:
+            consumers[stype].append(partial(merger.add, stype=stype))
+
+    # ARTIFACTS ====================================================
+    if artifacts:
+        from .artifacts import ArtifactDetector, make_artifact_outlet
+
+        detector = ArtifactDetector(make_artifact_outlet(address), channels)
+        for stype in ["EEG", "ACC", "GYRO"]:
+            if stype in consumers:
+                consumers[stype].append(partial(detector.add, stype=stype))
+
+    # DECIMATED ====================================================
+    # Lower-rate outlets, {stype: decimation factor}
+    for stype, factor in (decimate or {}).items():
+        from .decimate import Decimator, make_decimated_outlet
+
+        if stype not in consumers:
+            raise ValueError(f"Can't decimate {stype}, which is not streamed.")
+        outlet = make_decimated_outlet(stype, address, factor, channels)
+        consumers[stype].append(Decimator(outlet, factor, STREAMS[stype]["sfreq"]))
+
+    # FLIGHT RECORDER ====================================================
+    # Last minutes of each modality, in memory-mapped files of the ``flight`` directory
+    recorder = None
+    if flight is not None:
+        from .flight import FlightRecorder
+
+        recorder = FlightRecorder(flight, address, modalities, flight_minutes, channels)
+        for stype in modalities:
+            consumers[stype].append(partial(recorder.add, stype=stype))
+
+    # Custom processing (see pipeline.Pipeline), {stype: pipeline}
+    pipelines = pipelines or {}
+    for stype, pipeline in pipelines.items():
+        consumers[stype].append(pipeline)
+        pipeline.start()
+
+    # SOAK ====================================================
+    # Health of the process over long sessions, written to the ``soak`` file
+    soaker = None
+    if soak is not None:
+        from .soak import Soak
+
+        meta = {"address": address, "modalities": modalities, "speed": getattr(backend, "speed", 1.0)}
+        soaker = Soak(soak, soak_interval, top=soak_top, meta=meta)
+        for stype in modalities:
+            consumers[stype].append(soaker.counter(stype))
+
+    callbacks = {stype: _dispatch(functions) for stype, functions in consumers.items()}
+
+    # DIAGNOSTICS ====================================================
+    if diagnostics:
+        diagnostics = Diagnostics()
+        diagnostics_outlet = diagnostics.make_outlet(f"Muse_{address}")
+    else:
+        diagnostics = None
+        diagnostics_outlet = None
+    if soaker is not None:
+        # Latency of the handlers, per interval (unless it is also published)
+        soaker.reset_diagnostics = diagnostics is None
+        diagnostics = soaker.diagnostics = diagnostics or Diagnostics()
+
+    # STATUS ====================================================
+    monitor = None
+    if status:
+        from .status import StatusMonitor, make_status_outlet
+
+        monitor = StatusMonitor(make_status_outlet(address))
+
+    # LOAD SHEDDING ====================================================
+    shedder = None
+    if load_shedding:
+        from .shedding import LoadShedder, make_shedding_outlet
+
+        shedder = LoadShedder(make_shedding_outlet(address))
 
     muse = Muse(
         address=address,
-        callback_eeg=push_eeg,
-        callback_ppg=push_ppg,
-        callback_acc=push_acc,
-        callback_gyro=push_gyro,
+        callback_eeg=callbacks["EEG"],
+        callback_ppg=callbacks.get("PPG"),
+        callback_acc=callbacks.get("ACC"),
+        callback_gyro=callbacks.get("GYRO"),
         preset=preset,
+        diagnostics=diagnostics,
+        eeg_channels=channels,
+        backend=backend,
+        control=status,
+        callback_telemetry=None if monitor is None else monitor.telemetry,
     )
 
     didConnect = muse.connect()
@@ -106,21 +248,112 @@ def stream(address, ppg=True, acc=True, gyro=True, preset=None):
         print("Connected.")
         muse.start()
 
-        ppg_txt = ", PPG" if ppg else ""
-        acc_txt = ", ACC" if acc else ""
-        gyro_txt = ", GYRO" if gyro else ""
+        print(f"Streaming... {', '.join(modalities)}... (CTRL + C to interrupt)")
 
-        print(f"Streaming... EEG{ppg_txt}{acc_txt}{gyro_txt}... (CTRL + C to interrupt)")
+        tasks = []
+        if diagnostics_outlet is not None:
+            tasks.append(partial(diagnostics.publish, diagnostics_outlet))
+        if monitor is not None:
+            tasks.append(partial(monitor.poll, muse))
+        if recorder is not None:
+            tasks.append(recorder.flush)
+        if shedder is not None:
+            tasks.append(partial(shedder.poll, muse))
+        if soaker is not None:
+            soaker.start()
+            tasks.append(soaker.sample)
 
-        # Disconnect if no data is received for 60 seconds
-        while mne_lsl.lsl.local_clock() - muse.last_timestamp < 60:
-            try:
-                backends.sleep(1)
-            except KeyboardInterrupt:
-                muse.stop()
-                print("Stream interrupted. Stopping...")
-                break
+        # Stop when the ``stop`` event is set, or after ``duration`` seconds (if any)
+        if stop is None:
+            stop = threading.Event()
+        if duration is not None:
+            timer = threading.Timer(duration, stop.set)
+            timer.daemon = True
+            timer.start()
 
-        if mne_lsl.lsl.local_clock() - muse.last_timestamp > 60:
-            print("No data received for 60 seconds. Disconnecting...")
+        try:
+            if supervise(muse, stall_timeout, keep_alive_interval, max_retries, tasks, stop):
+                muse.stop()
+            else:
+                print(f"Could not reconnect after {max_retries} attempts. Disconnecting...")
+        except KeyboardInterrupt:
+            muse.stop()
+            print("Stream interrupted. Stopping...")
         print("Disconnected.")
+
+    for pipeline in pipelines.values():
+        pipeline.stop()
+    if merger is not None:
+        merger.stop()
+    if recorder is not None:
+        recorder.flush(force=True)
+    if soaker is not None:
+        soaker.stop()
+
+
+def push(data, timestamps, outlet):
+    outlet.push_chunk(data.T, timestamps[-1])
+
+
+def _dispatch(functions):
+    """Combine several data callbacks into one."""
+    if len(functions) == 1:
+        return functions[0]
+
+    def callback(data, timestamps):
+        for function in functions:
+            function(data, timestamps)
+
+    return callback
+
+
+def supervise(muse, stall_timeout=5, keep_alive_interval=10, max_retries=10, tasks=(), stop=None):
+    """Keep a streaming Muse alive.
+
+    Keep-alive commands are sent every ``keep_alive_interval`` seconds. If no data is received
+    for ``stall_timeout`` seconds, the device is reconnected (with exponential backoff between
+    attempts). The callbacks (and thus the LSL outlets) and the clock-sync state of the Muse
+    are kept, so that consumers do not need to re-resolve the streams. ``tasks`` are called
+    at each iteration (e.g., to publish low-rate outlets). The loop runs until the ``stop``
+    event (if any) is set.
+
+    Returns False if the device could not be reconnected after ``max_retries`` attempts.
+    """
+    poll = min(1, stall_timeout / 4)
+    last_keep_alive = mne_lsl.lsl.local_clock()
+
+    while stop is None or not stop.is_set():
+        backends.sleep(poll)
+        for task in tasks:
+            task()
+
+        now = mne_lsl.lsl.local_clock()
+        if now - muse.last_timestamp > stall_timeout:
+            print(f"No data received for {stall_timeout} seconds. Reconnecting...")
+            if not _reconnect(muse, max_retries):
+                return False
+            last_keep_alive = mne_lsl.lsl.local_clock()
+        elif now - last_keep_alive > keep_alive_interval:
+            try:
+                muse.keep_alive()
+            except Exception as e:
+                # The link is lost (the stall would be detected later), reconnect now
+                print(f"Keep-alive failed ({e}). Reconnecting...")
+                if not _reconnect(muse, max_retries):
+                    return False
+            last_keep_alive = mne_lsl.lsl.local_clock()
+    return True
+
+
+def _reconnect(muse, max_retries=10, max_delay=30):
+    delay = 1
+    for _ in range(max_retries):
+        try:
+            muse.reconnect()
+            print("Reconnected.")
+            return True
+        except Exception as e:
+            print(f"Reconnection failed ({e}). Retrying in {delay} seconds...")
+            time.sleep(delay)
+            delay = min(2 * delay, max_delay)
+    return False
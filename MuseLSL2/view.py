@@ -8,11 +8,16 @@ Multiple real-time digital signals with GLSL-based clipping.
 """
 
 
+import math
+import threading
+
 import matplotlib.pyplot as plt
 import mne_lsl.lsl
 import numpy as np
 from vispy import app, gloo, visuals
 
+from .ringbuffer import RingBuffer
+
 VERT_SHADER = """
 #version 120
 // y coordinate of the position.
@@ -70,100 +75,340 @@ void main() {
 }
 """
 
+# Spectrogram panel: one textured quad, the texture being used as a circular buffer of columns
+SPECTROGRAM_VERT_SHADER = """
+#version 120
+attribute vec2 a_position;
+attribute vec2 a_texcoord;
+varying vec2 v_texcoord;
+void main() {
+    gl_Position = vec4(a_position, 0.0, 1.0);
+    v_texcoord = a_texcoord;
+}
+"""
 
-def view():
-    print("Looking for a stream...")
-    eeg = mne_lsl.lsl.resolve_streams(stype="EEG", timeout=5)
-    ppg = mne_lsl.lsl.resolve_streams(stype="PPG", timeout=5)
+SPECTROGRAM_FRAG_SHADER = """
+#version 120
+uniform sampler2D u_texture;
+uniform sampler2D u_colormap;
+// Position of the oldest column in the texture (which is drawn on the left).
+uniform float u_offset;
+varying vec2 v_texcoord;
+void main() {
+    float value = texture2D(u_texture, vec2(fract(v_texcoord.x + u_offset), v_texcoord.y)).r;
+    gl_FragColor = texture2D(u_colormap, vec2(clamp(value, 0., 1.), 0.5));
+}
+"""
 
-    if len(eeg) == 0:
-        raise RuntimeError("Can't find EEG stream.")
-    else:
-        eeg = mne_lsl.lsl.StreamInlet(eeg[0])
-    if len(ppg) == 0:
-        ppg = None
-    else:
-        ppg = mne_lsl.lsl.StreamInlet(ppg[0])
+# Fraction of the width of the canvas used by the traces (the spectrogram is on the right)
+TRACES_WIDTH = 0.75
 
-    print("Start acquiring data.")
 
-    Canvas(eeg=eeg, ppg=ppg)
-    app.run()
+def view(fps=30, catch_up=1.0):
+    """Show all the Muse streams of the network, redrawn ``fps`` times per second.
 
+    See ``Device`` for ``catch_up``.
+    """
+    print("Looking for streams...")
+    # Full-rate streams only (not the 'MuseDecimated' ones)
+    eeg = mne_lsl.lsl.resolve_streams(name="Muse", stype="EEG", timeout=5)
+    ppg = mne_lsl.lsl.resolve_streams(name="Muse", stype="PPG", timeout=5)
 
-class Canvas(app.Canvas):
-    def __init__(self, eeg, ppg=None):
-        app.Canvas.__init__(self, title="MuseLSL2 - Use your wheel to zoom!", keys="interactive")
+    if len(eeg) == 0:
+        raise RuntimeError("Can't find EEG stream.")
 
-        # Get info from stream
-        eeg_info = _view_info(eeg)
+    # One device per source (i.e., "Muse_{address}"), with its PPG stream if any
+    ppg = {info.source_id: info for info in ppg}
+    devices = []
+    # Timestamps are mapped to the local clock, to measure the display lag
+    flags = ["clocksync"]
+    for info in sorted(eeg, key=lambda info: info.source_id):
+        inlet = None
+        if info.source_id in ppg:
+            inlet = mne_lsl.lsl.StreamInlet(ppg[info.source_id], processing_flags=flags)
+        devices.append(Device(mne_lsl.lsl.StreamInlet(info, processing_flags=flags), inlet, catch_up=catch_up))
+
+    print(f"Start acquiring data from {len(devices)} device(s).")
+
+    for device in devices:
+        device.start()
+    try:
+        Canvas(devices, fps)
+        app.run()
+    finally:
+        for device in devices:
+            device.stop()
+
+
+# Channel colors
+EEG_COLORS = [
+    (142 / 255, 39 / 255, 176 / 255),  # Purple
+    (3 / 255, 169 / 255, 244 / 255),  # Blue
+    (33 / 255, 150 / 255, 243 / 255),  # Dark blue
+    (103 / 255, 58 / 255, 183 / 255),  # Dark Purple
+    (0 / 255, 0 / 255, 0 / 255),  # Black
+]
+PPG_COLORS = [
+    (255 / 255, 193 / 255, 7 / 255),  # Lux
+    (194 / 255, 24 / 255, 91 / 255),  # RED
+    (244 / 255, 67 / 255, 54 / 255),  # IR
+]
+
+
+class Device:
+    """Data window of one headset: EEG, and PPG resampled on the EEG timestamps (if any).
+
+    Channels are stored in display order (from top to bottom), in a ring buffer of ``window``
+    seconds. After ``start()``, a background thread keeps draining the inlets into the ring
+    buffer, independently of the rendering. If more than ``catch_up`` seconds of data are
+    waiting in the inlet (e.g., after the process was stalled), they are dropped, so that the
+    display jumps back to real time (None to never drop data).
+    """
+
+    def __init__(self, eeg, ppg=None, window=10, catch_up=1.0):
+        eeg_info = _view_info(eeg, window)
+        self.name = eeg_info["info"].source_id
         self.ch_names = eeg_info["ch_names"]
-        self.n_channels = eeg_info["n_channels"]
-
-        # Channel colors
-        colors = [
-            (142 / 255, 39 / 255, 176 / 255),  # Purple
-            (3 / 255, 169 / 255, 244 / 255),  # Blue
-            (33 / 255, 150 / 255, 243 / 255),  # Dark blue
-            (103 / 255, 58 / 255, 183 / 255),  # Dark Purple
-            (0 / 255, 0 / 255, 0 / 255),  # Black
-        ]
-        # Colors for impedence
-        self.colors_quality = plt.get_cmap("RdYlGn")(np.linspace(0, 1, 11))[::-1]
+        self.n_eeg = eeg_info["n_channels"]
+        self.colors = EEG_COLORS[: self.n_eeg]
 
         # PPG ------------------------------------------------
-        ppg_info = None
+        self.ppg = None
+        self.n_ppg = 0
         if ppg is not None:
-            ppg_info = _view_info(ppg)
-            self.ch_names += ppg_info["ch_names"]
-            self.n_channels += ppg_info["n_channels"]
-            colors += [
-                (255 / 255, 193 / 255, 7 / 255),  # Lux
-                (194 / 255, 24 / 255, 91 / 255),  # RED
-                (244 / 255, 67 / 255, 54 / 255),  # IR
-            ]
-
-        # Number of cols and rows in the table.
-        n_rows = len(colors)
-        n_cols = 1
+            ppg_info = _view_info(ppg, window)
+            self.ppg = ppg_info["inlet"]
+            self.n_ppg = ppg_info["n_channels"]
+            self.ch_names = self.ch_names + ppg_info["ch_names"]
+            self.colors = self.colors + PPG_COLORS[: self.n_ppg]
+
+        self.eeg = eeg_info["inlet"]
+        self.sfreq = eeg_info["sfreq"]
+        self.n_samples = eeg_info["n_samples"]
+        self.n_channels = len(self.ch_names)
 
         # Initialize data to zero
-        self.data = np.zeros((eeg_info["n_samples"], n_rows))
+        self.ring = RingBuffer(self.n_channels, self.n_samples)
+        self.ring.write(np.zeros((self.n_samples, self.n_channels)), np.zeros(self.n_samples))
+        self.lock = threading.Lock()  # Between the drain thread and the rendering
+
+        self.catch_up = catch_up
+        self.skipped = 0  # Samples dropped to catch up
+        self.latest = None  # Timestamp of the last sample
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Drain the inlets in a background thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._drain, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _drain(self, poll=0.005):
+        while not self._stop.is_set():
+            if not self.pull():
+                self._stop.wait(poll)
+
+    @property
+    def lag(self):
+        """Age of the last sample received (in seconds), or None before the first sample."""
+        if self.latest is None:
+            return None
+        return mne_lsl.lsl.local_clock() - self.latest
+
+    def pull(self):
+        """Pull all new samples from the inlets into the data window.
+
+        Returns the number of EEG samples pulled.
+        """
+        if self.catch_up is not None and self.eeg.samples_available > self.catch_up * self.sfreq:
+            self.skipped += self.eeg.flush()
+            if self.ppg is not None:
+                self.ppg.flush()
+
+        samples, time = self.eeg.pull_chunk(timeout=0, max_samples=self.n_samples)
+        if len(time) == 0:
+            return 0
+
+        if self.ppg is not None:
+            new_samples, new_time = self.ppg.pull_chunk(timeout=0, max_samples=self.n_samples)
+            if len(new_samples) > 0:
+                # For each eeg timestamp, find closest ppg timestamp
+                closest_times = np.argmin(np.abs(new_time[:, np.newaxis] - time), axis=0)
+                new_samples = new_samples[closest_times, :]
+            else:
+                last = self.ring.latest(1)[0][0, self.n_eeg :]
+                new_samples = np.tile(last, (len(samples), 1))
+            samples = np.hstack([samples, new_samples])
+
+        with self.lock:
+            self.ring.write(samples, time)
+        self.latest = time[-1]
+        return len(time)
+
+    def plot_data(self):
+        """Rescale the data window for plotting and compute the signal quality of EEG channels.
+
+        Returns the data (n_channels, n_samples), the standard deviation of the last second of
+        each EEG channel, and its discretization into 11 levels (for coloring).
+        """
+        with self.lock:
+            data, _ = self.ring.latest(self.n_samples)
+            plot_data = data.T.copy()
+
+        # Normalize EEG --------------------
+        eeg = plot_data[: self.n_eeg]
+        eeg -= eeg.mean(axis=1, keepdims=True)
+        # Compute Impedence
+        sd = np.std(eeg[:, -int(self.sfreq) :], axis=1)
+        eeg /= 500
+        # Discretize the impedence into 11 levels for coloring
+        co = np.int32(np.tanh((sd - 30) / 15) * 5 + 5)
+
+        # Normalize PPG --------------------
+        if self.ppg is not None:
+            ppg = plot_data[self.n_eeg :]
+            ppg -= ppg.mean(axis=1, keepdims=True)
+            ppg /= np.nanstd(ppg, axis=1, keepdims=True)
+        return plot_data, sd, co
+
+
+class Spectrogram:
+    """Incremental short-time Fourier transform of the EEG channels of a device.
+
+    A column (Hann window of ``n_fft`` samples) is computed every ``hop`` new samples of the data
+    window of the device: ``update()`` only transforms the windows ending in the samples received
+    since the last call, for all channels at once. Columns have one row per channel and frequency
+    (from ``fmin`` to ``fmax``), ordered from the bottom (lowest frequency of the last channel) to
+    the top, and contain the power spectral density in dB, scaled to [0, 1] between ``vmin`` and
+    ``vmax``.
+    """
+
+    def __init__(self, device, n_fft=256, hop=32, fmin=1, fmax=40, vmin=-10, vmax=30):
+        self.device = device
+        self.n_fft = n_fft
+        self.hop = hop
+        self.vmin = vmin
+        self.vmax = vmax
+        self.taper = np.hanning(n_fft)
+        self.scale = 2 / (device.sfreq * np.sum(self.taper**2))  # One-sided PSD
+        freqs = np.fft.rfftfreq(n_fft, 1 / device.sfreq)
+        self.bins = np.flatnonzero((freqs >= fmin) & (freqs <= fmax))
+        self.n_rows = device.n_eeg * len(self.bins)
+        # As many columns as the data window (so that both scroll at the same speed)
+        self.n_columns = device.n_samples // hop
+        # At most the columns whose windows are all in the data window (wherever the count is
+        # within the hop)
+        self.max_columns = (device.ring.capacity - n_fft - hop + 1) // hop + 1
+        self._last = device.ring.count  # End of the window of the last column
+
+    def update(self):
+        """Return the new columns (n_rows, n_new), or None if there is no new column."""
+        with self.device.lock:
+            n_new = (self.device.ring.count - self._last) // self.hop
+            if n_new <= 0:
+                return None
+            if n_new > self.max_columns:
+                # After a stall, skip the columns whose windows were overwritten (on the hop grid)
+                self._last += (n_new - self.max_columns) * self.hop
+                n_new = self.max_columns
+            stop = self._last + n_new * self.hop
+            self._last = stop
+            data, _ = self.device.ring.read(stop - self.n_fft - (n_new - 1) * self.hop, stop)
+            eeg = data[:, : self.device.n_eeg][:, ::-1].T.copy()  # Last channel at the bottom
+        # (n_channels, n_new, n_fft), with one window per column
+        windows = np.lib.stride_tricks.sliding_window_view(eeg, self.n_fft, axis=1)[:, :: self.hop]
+        windows = windows - windows.mean(axis=2, keepdims=True)
+        spectra = np.fft.rfft(windows * self.taper, axis=2)[..., self.bins]
+        power = 10 * np.log10(self.scale * np.abs(spectra) ** 2 + 1e-12)
+        columns = (power - self.vmin) / (self.vmax - self.vmin)
+        return np.ascontiguousarray(columns.transpose(0, 2, 1).reshape(self.n_rows, n_new), dtype=np.float32)
+
+
+class Canvas(app.Canvas):
+    """Grid of devices, each showing its channels from top to bottom.
+
+    The signals of all devices are drawn with one vertex buffer and one 'line_strip' draw
+    call, and the labels with two text visuals (names and signal quality). The spectrogram of
+    the EEG of the focused device (switched with Tab) is shown on the right: its new columns
+    are uploaded into a texture used as a circular buffer, which is never re-uploaded whole.
+
+    The data is pulled by the devices (see ``Device.start()``): the canvas only draws their
+    latest state, ``fps`` times per second, and shows the display lag of each device.
+    """
+
+    def __init__(self, devices, fps=30):
+        app.Canvas.__init__(self, title="MuseLSL2 - Use your wheel to zoom!", keys="interactive")
+        self.devices = devices
+        if len({device.n_samples for device in devices}) > 1:
+            raise ValueError("All devices must have the same EEG sampling rate.")
+
+        # Grid of devices, with the same number of rows for each device
+        self.grid_cols = int(math.ceil(math.sqrt(len(devices))))
+        self.grid_rows = int(math.ceil(len(devices) / self.grid_cols))
+        self.rows_per_device = max(device.n_channels for device in devices)
+        n_rows = self.grid_rows * self.rows_per_device
+        n_samples = devices[0].n_samples
+
+        # Column and row (from the bottom) of each signal
+        cols, rows, colors = [], [], []
+        for d, device in enumerate(devices):
+            grid_row, grid_col = divmod(d, self.grid_cols)
+            for i in range(device.n_channels):
+                cols.append(grid_col)
+                rows.append(n_rows - 1 - (grid_row * self.rows_per_device + i))
+            colors += device.colors
+        self.positions = np.zeros((len(rows), n_samples), dtype=np.float32)
 
         # Signal 2D index of each vertex (row and col) and x-index (sample index
         # within each signal).
         index = np.c_[
-            np.repeat(np.repeat(np.arange(n_cols), n_rows), eeg_info["n_samples"]),
-            np.repeat(np.tile(np.arange(n_rows), n_cols), eeg_info["n_samples"]),
-            np.tile(np.arange(eeg_info["n_samples"]), n_rows),
+            np.repeat(cols, n_samples),
+            np.repeat(rows, n_samples),
+            np.tile(np.arange(n_samples), len(rows)),
         ].astype(np.float32)
 
         self.program = gloo.Program(VERT_SHADER, FRAG_SHADER)
-        self.program["a_position"] = self.data.T.astype(np.float32).reshape(-1, 1)
+        self.program["a_position"] = self.positions.reshape(-1, 1)
         self.program["a_index"] = index
-        self.program["a_color"] = np.repeat(colors[::-1], eeg_info["n_samples"], axis=0).astype(np.float32)
+        self.program["a_color"] = np.repeat(colors, n_samples, axis=0).astype(np.float32)
         self.program["u_scale"] = (1.0, 1.0)
-        self.program["u_size"] = (n_rows, n_cols)
-        self.program["u_n"] = eeg_info["n_samples"]
-
-        # Text
-        self.font_size = 48.0
-        self.display_names = []
-        self.display_quality = []
-        for channel in self.ch_names:
-            text = visuals.TextVisual(channel, bold=True, color="black")
-            self.display_names.append(text)
-            text = visuals.TextVisual("", bold=True, color="black")
-            self.display_quality.append(text)
-
-        # Store
-        self.eeg = eeg_info["inlet"]
-        self.ppg = False if ppg is None else ppg_info["inlet"]
-        self.n_samples = eeg_info["n_samples"]
-        self.sfreq = eeg_info["sfreq"]
+        self.program["u_size"] = (n_rows, self.grid_cols)
+        self.program["u_n"] = n_samples
+
+        # Colors for impedence
+        self.colors_quality = plt.get_cmap("RdYlGn")(np.linspace(0, 1, 11))[::-1]
+
+        # Text: the device name and channel names, and the signal quality of the EEG channels
+        names = []
+        for device in devices:
+            names += [device.name] + device.ch_names
+        self.display_names = visuals.TextVisual(names, bold=True, color="black", font_size=8)
+        n_eeg = sum(device.n_eeg for device in devices)
+        self.display_quality = visuals.TextVisual([""] * n_eeg, bold=True, color="black", font_size=8)
+        self.display_lag = visuals.TextVisual([""] * len(devices), color="gray", font_size=7)
+
+        # Spectrogram of the focused device
+        self.spectrogram_program = gloo.Program(SPECTROGRAM_VERT_SHADER, SPECTROGRAM_FRAG_SHADER)
+        self.spectrogram_program["a_position"] = np.array(
+            [[-1, -1], [-1, 1], [1, -1], [1, 1]], dtype=np.float32
+        )
+        self.spectrogram_program["a_texcoord"] = np.array([[0, 0], [0, 1], [1, 0], [1, 1]], dtype=np.float32)
+        colormap = plt.get_cmap("viridis")(np.linspace(0, 1, 256))[np.newaxis]
+        self.spectrogram_program["u_colormap"] = gloo.Texture2D(
+            colormap.astype(np.float32), interpolation="linear"
+        )
+        self.focus(0)
 
         # View
-        self._timer = app.Timer("auto", connect=self.on_timer, start=True)
+        self._timer = app.Timer(1 / fps, connect=self.on_timer, start=True)
         gloo.set_viewport(0, 0, *self.physical_size)
         gloo.set_state(
             clear_color="white",
@@ -173,66 +418,54 @@ class Canvas(app.Canvas):
 
         self.show()
 
-    def update_data(self, outlet, samples, time, n_channels=3):
-        new_samples, new_time = outlet.pull_chunk(timeout=0, max_samples=100)
-        if len(new_samples) > 0:
-            # For each eeg timestamp, find closest ppg timestamp
-            closest_times = np.argmin(np.abs(new_time[:, np.newaxis] - time), axis=0)
-            # Reverse and get closest
-            new_samples = new_samples[:, ::-1][closest_times, :]
-
-        else:
-            new_samples = np.tile(self.data[-1, 0:n_channels], (len(samples), 1))
-
-        # Concat with samples
-        samples = np.hstack([new_samples, samples])
-        return samples
+    def focus(self, index):
+        """Show the spectrogram of the device ``index``."""
+        self.focused = index % len(self.devices)
+        self.spectrogram = Spectrogram(self.devices[self.focused])
+        shape = (self.spectrogram.n_rows, self.spectrogram.n_columns)
+        self.texture = gloo.Texture2D(np.zeros(shape, dtype=np.float32), interpolation="linear")
+        self.spectrogram_program["u_texture"] = self.texture
+        self.spectrogram_program["u_offset"] = 0.0
+        self.column = 0  # Next column of the texture to write
+        self.title = f"MuseLSL2 - Spectrogram of {self.devices[self.focused].name} (Tab to switch)"
+
+    def _upload_columns(self, columns):
+        """Write the new columns after the last one, wrapping around the texture."""
+        n_columns = self.spectrogram.n_columns
+        columns = columns[:, -n_columns:]
+        first = min(columns.shape[1], n_columns - self.column)
+        self.texture.set_data(np.ascontiguousarray(columns[:, :first]), offset=(0, self.column))
+        if first < columns.shape[1]:
+            self.texture.set_data(np.ascontiguousarray(columns[:, first:]), offset=(0, 0))
+        self.column = (self.column + columns.shape[1]) % n_columns
+        self.spectrogram_program["u_offset"] = self.column / n_columns
 
     def on_timer(self, event):
-        """Add some data at the end of each signal (real-time signals)."""
-
-        # EEG ------------------------------------------------
-        samples, time = self.eeg.pull_chunk(timeout=0, max_samples=100)
-
-        # Update data
-        if len(time) > 0:
-            samples = samples[:, ::-1]  # Reverse channels
-
-            # PPG ------------------------------------------------
-            if self.ppg:
-                samples = self.update_data(outlet=self.ppg, samples=samples, time=time, n_channels=3)
-
-            self.data = np.vstack([self.data, samples])  # Concat
-            self.data = self.data[-self.n_samples :]  # Keep only last window length
-
-        # Rescaling
-        plot_data = self.data.copy()
-
-        # Normalize EEG (last 5 channels) --------------------
-        plot_data[:, -5:] = (plot_data[:, -5:] - plot_data[:, -5:].mean(axis=0)) / 500
-        # Compute Impedence
-        sd = np.std(plot_data[-int(self.sfreq) :, -5:], axis=0)[::-1] * 500
-        # Discretize the impedence into 11 levels for coloring
-        co = np.int32(np.tanh((sd - 30) / 15) * 5 + 5)
-        # Loop through the 5 last channels indices (EEG channels)
-        for i in range(5):
-            self.display_quality[i].text = f"{sd[i]:.2f}"
-            self.display_quality[i].color = self.colors_quality[co[i]]
-            self.display_quality[i].font_size = 12 + co[i]
-
-            self.display_names[i].font_size = 12 + co[i]
-            self.display_names[i].color = self.colors_quality[co[i]]
-
-        # Normalize PPG (3 channels) --------------------
-        if self.ppg:
-            plot_data[:, 0:3] = (plot_data[:, 0:3] - plot_data[:, 0:3].mean(axis=0)) / np.nanstd(
-                plot_data[:, 0:3], axis=0
-            )
-
-        self.program["a_position"].set_data(plot_data.T.ravel().astype(np.float32))
+        """Draw the latest data of each device."""
+        texts, colors, lags = [], [], []
+        row = 0
+        for device in self.devices:
+            plot_data, sd, co = device.plot_data()
+            lags.append(_lag_text(device))
+            self.positions[row : row + device.n_channels] = plot_data
+            row += device.n_channels
+            texts += [f"{value:.2f}" for value in sd]
+            colors.append(self.colors_quality[co])
+
+        columns = self.spectrogram.update()
+        if columns is not None:
+            self._upload_columns(columns)
+
+        self.display_quality.text = texts
+        self.display_quality.color = np.concatenate(colors)
+        self.display_lag.text = lags
+        self.program["a_position"].set_data(self.positions.reshape(-1, 1))
         self.update()
 
     def on_key_press(self, event):
+        if event.key.name == "Tab":
+            self.focus(self.focused + 1)
+            self.update()
         # increase time scale
         if event.key.name in ["+", "-"]:
             if event.key.name == "+":
@@ -262,29 +495,50 @@ class Canvas(app.Canvas):
         vp = (0, 0, self.physical_size[0], self.physical_size[1])
         self.context.set_viewport(*vp)
 
-        # Text position
-        for i, t in enumerate(self.display_names):
-            t.transforms.configure(canvas=self, viewport=vp)
-            t.pos = (
-                self.size[0] * 0.075,
-                ((i + 0.5) / self.n_channels) * self.size[1],
-            )
-
-        for i, t in enumerate(self.display_quality):
-            t.transforms.configure(canvas=self, viewport=vp)
-            t.pos = (
-                self.size[0] * 0.925,
-                ((i + 0.5) / self.n_channels) * self.size[1],
-            )
+        # Text positions (in pixels, from the top left corner)
+        width = self.size[0] * TRACES_WIDTH / self.grid_cols
+        height = self.size[1] / (self.grid_rows * self.rows_per_device)
+        names, quality, lags = [], [], []
+        for d, device in enumerate(self.devices):
+            grid_row, grid_col = divmod(d, self.grid_cols)
+            top = grid_row * self.rows_per_device * height
+            names.append((grid_col * width + 0.5 * width, top + 0.15 * height))
+            lags.append((grid_col * width + 0.85 * width, top + 0.15 * height))
+            for i in range(device.n_channels):
+                y = top + (i + 0.5) * height
+                names.append((grid_col * width + 0.075 * width, y))
+                if i < device.n_eeg:
+                    quality.append((grid_col * width + 0.925 * width, y))
+
+        texts = [(self.display_names, names), (self.display_quality, quality), (self.display_lag, lags)]
+        for text, pos in texts:
+            text.transforms.configure(canvas=self, viewport=vp)
+            text.pos = np.array(pos)
 
     def on_draw(self, event):
         gloo.clear()
-        gloo.set_viewport(0, 0, *self.physical_size)
+        width, height = self.physical_size
+        traces = int(width * TRACES_WIDTH)
+        gloo.set_viewport(0, 0, traces, height)
         self.program.draw("line_strip")
-        [t.draw() for t in self.display_names + self.display_quality]
+        gloo.set_viewport(traces, 0, width - traces, height)
+        self.spectrogram_program.draw("triangle_strip")
+        gloo.set_viewport(0, 0, width, height)
+        self.display_names.draw()
+        self.display_quality.draw()
+        self.display_lag.draw()
+
+
+def _lag_text(device):
+    """Display lag of a device (and the data skipped to catch up, if any)."""
+    lag = device.lag
+    text = "waiting for data" if lag is None else f"lag {1000 * lag:.0f} ms"
+    if device.skipped:
+        text += f", skipped {device.skipped / device.sfreq:.1f} s"
+    return text
 
 
-def _view_info(inlet):
+def _view_info(inlet, window=10):
     """Get info from stream"""
     inlet.open_stream()
 
@@ -292,7 +546,7 @@ def _view_info(inlet):
     info["info"] = inlet.get_sinfo()
     info["description"] = info["info"].desc
 
-    info["window"] = 10  # 10-second window showing the data.
+    info["window"] = window  # 10-second window showing the data.
     info["sfreq"] = info["info"].sfreq
     info["n_samples"] = int(info["sfreq"] * info["window"])
     info["ch_names"] = info["info"].get_channel_names()
@@ -0,0 +1,130 @@
+"""Reading and writing XDF files (https://github.com/sccn/xdf/wiki/Specifications)."""
+
+import struct
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+# Chunk tags
+_FILE_HEADER = 1
+_STREAM_HEADER = 2
+_SAMPLES = 3
+_CLOCK_OFFSET = 4
+_STREAM_FOOTER = 6
+
+# Fields added to the stream info by pyxdf, that are not part of the XDF headers
+_PYXDF_FIELDS = ["stream_id", "effective_srate", "segments", "clock_segments"]
+
+_FORMATS = {
+    "int8": "<i1",
+    "int16": "<i2",
+    "int32": "<i4",
+    "int64": "<i8",
+    "float32": "<f4",
+    "double64": "<f8",
+}
+
+
+def load_xdf(path, **kwargs):
+    """Load an XDF file with pyxdf (returns streams, header)."""
+    try:
+        import pyxdf
+    except ImportError:
+        raise ImportError("pyxdf is required to read XDF files. Install it with `pip install pyxdf`.")
+
+    return pyxdf.load_xdf(path, **kwargs)
+
+
+def write_xdf(path, streams, header=None, chunk_size=1024):
+    """Write streams to an XDF file.
+
+    streams -- list of dicts with keys "info", "time_series" and "time_stamps", as returned by
+               pyxdf. "info" is a dict of lists (pyxdf style), e.g. {"name": ["Muse"], ...}, that
+               must at least contain "name", "type", "channel_count", "nominal_srate" and
+               "channel_format".
+    header -- file header, as returned by pyxdf (optional)
+
+    The timestamps are written as they are (already synchronized), with zero clock offsets at
+    the first and last timestamps of each stream.
+    """
+    if header is None:
+        header = {"info": {"version": ["1.0"]}}
+
+    with open(path, "wb") as f:
+        f.write(b"XDF:")
+        _write_chunk(f, _FILE_HEADER, _to_xml(header["info"]))
+
+        for stream_id, stream in enumerate(streams, start=1):
+            sid = struct.pack("<I", stream_id)
+            info = stream["info"]
+            _write_chunk(f, _STREAM_HEADER, sid + _to_xml(info))
+
+            timestamps = np.asarray(stream["time_stamps"], dtype=np.float64)
+            for start in range(0, len(timestamps), chunk_size):
+                stop = start + chunk_size
+                samples = _pack_samples(
+                    stream["time_series"][start:stop], timestamps[start:stop], info["channel_format"][0]
+                )
+                _write_chunk(f, _SAMPLES, sid + _varlen(len(timestamps[start:stop])) + samples)
+
+            for timestamp in timestamps[[0, -1]] if len(timestamps) > 0 else []:
+                _write_chunk(f, _CLOCK_OFFSET, sid + struct.pack("<dd", timestamp, 0.0))
+
+            footer = {"sample_count": [str(len(timestamps))]}
+            if len(timestamps) > 0:
+                footer["first_timestamp"] = [repr(timestamps[0])]
+                footer["last_timestamp"] = [repr(timestamps[-1])]
+            _write_chunk(f, _STREAM_FOOTER, sid + _to_xml(footer))
+
+
+def _varlen(n):
+    if n < 256:
+        return struct.pack("<BB", 1, n)
+    if n < 2**32:
+        return struct.pack("<BI", 4, n)
+    return struct.pack("<BQ", 8, n)
+
+
+def _write_chunk(f, tag, content):
+    f.write(_varlen(len(content) + 2))
+    f.write(struct.pack("<H", tag))
+    f.write(content)
+
+
+def _pack_samples(values, timestamps, channel_format):
+    """Encode samples with their timestamps (vectorized for numeric formats)."""
+    if channel_format == "string":
+        out = bytearray()
+        for sample, timestamp in zip(values, timestamps):
+            out += struct.pack("<Bd", 8, timestamp)
+            for value in sample:
+                value = str(value).encode("utf-8")
+                out += _varlen(len(value)) + value
+        return bytes(out)
+
+    values = np.asarray(values)
+    dtype = np.dtype([("n", "u1"), ("t", "<f8"), ("x", _FORMATS[channel_format], values.shape[1:])])
+    samples = np.empty(len(timestamps), dtype=dtype)
+    samples["n"] = 8
+    samples["t"] = timestamps
+    samples["x"] = values
+    return samples.tobytes()
+
+
+def _to_xml(info):
+    """Convert a pyxdf-style dict of lists to an '<info>' XML document."""
+    root = ET.Element("info")
+    _fill(root, info)
+    return b'<?xml version="1.0"?>' + ET.tostring(root)
+
+
+def _fill(element, info):
+    for key, values in info.items():
+        if key in _PYXDF_FIELDS:
+            continue
+        for value in values:
+            child = ET.SubElement(element, key)
+            if isinstance(value, dict):
+                _fill(child, value)
+            elif value is not None:
+                child.text = str(value)
@@ -0,0 +1,69 @@
+"""Decoding, frame assembly and timestamp correction in the Muse handlers."""
+
+import numpy as np
+
+from .fixtures import EEG_HANDLES, PPG_HANDLES, eeg_packet, make_muse, packets, ppg_packet
+
+
+class Unpack:
+    def setup(self):
+        self.muse = make_muse()
+        self.eeg, self.ppg, self.imu = packets(256)
+
+    def time_unpack_eeg_channel(self):
+        for packet in self.eeg:
+            self.muse._unpack_eeg_channel(packet)
+
+    def time_unpack_ppg_channel(self):
+        for packet in self.ppg:
+            self.muse._unpack_ppg_channel(packet)
+
+    def time_unpack_imu_channel(self):
+        for packet in self.imu:
+            self.muse._unpack_imu_channel(packet, scale=0.0000610352)
+
+
+class Handle:
+    """Full handler path for 64 frames, with a no-op callback."""
+
+    def setup(self):
+        self.muse = make_muse()
+        rng = np.random.default_rng(42)
+        self.eeg = [
+            [(handle, eeg_packet(i, rng.integers(0, 4096, 12))) for handle in EEG_HANDLES]
+            for i in range(1, 65)
+        ]
+        self.ppg = [
+            [(handle, ppg_packet(i, rng.integers(0, 2**24, 6))) for handle in PPG_HANDLES]
+            for i in range(1, 65)
+        ]
+        _, _, self.imu = packets(64)
+
+    def time_handle_eeg(self):
+        self.muse.last_tm = 0  # packet counter restarts at each repeat
+        for frame in self.eeg:
+            for handle, packet in frame:
+                self.muse._handle_eeg(handle, packet)
+
+    def time_handle_ppg(self):
+        self.muse.last_tm_ppg = 0
+        for frame in self.ppg:
+            for handle, packet in frame:
+                self.muse._handle_ppg(handle, packet)
+
+    def time_handle_acc(self):
+        for packet in self.imu:
+            self.muse._handle_acc(23, packet)
+
+
+class TimestampCorrection:
+    def setup(self):
+        self.muse = make_muse()
+        self.muse._init_timestamp_correction()
+        t0 = self.muse.reg_params[0]
+        jitter = np.random.default_rng(42).exponential(0.005, 1000)
+        self.updates = [(12 * i + 11, t0 + (12 * i + 11) / 256 + jitter[i]) for i in range(1000)]
+
+    def time_update_timestamp_correction(self):
+        for t_source, t_receiver in self.updates:
+            self.muse._update_timestamp_correction(t_source, t_receiver)
@@ -0,0 +1,52 @@
+"""Pushing frames to the LSL outlets."""
+
+import mne_lsl.lsl
+import numpy as np
+
+from MuseLSL2.stream import push
+
+
+class Push:
+    params = [("EEG", 5, 256, 12), ("PPG", 3, 64, 6), ("ACC", 3, 52, 3)]
+    param_names = ["stream"]
+
+    def setup(self, stream):
+        stype, n_channels, sfreq, n_samples = stream
+        info = mne_lsl.lsl.StreamInfo(
+            "MuseBenchmark",
+            stype=stype,
+            n_channels=n_channels,
+            sfreq=sfreq,
+            dtype="float32",
+            source_id="Muse_benchmark",
+        )
+        self.outlet = mne_lsl.lsl.StreamOutlet(info)
+        self.data = np.random.default_rng(42).normal(size=(n_channels, n_samples))
+        self.timestamps = mne_lsl.lsl.local_clock() + np.arange(n_samples) / sfreq
+
+    def teardown(self, stream):
+        del self.outlet
+
+    def time_push(self, stream):
+        for _ in range(100):
+            push(self.data, self.timestamps, self.outlet)
+
+
+class PipelineFilter:
+    """Filtering EEG frames in a pipeline (in the calling thread)."""
+
+    def setup(self):
+        from MuseLSL2.pipeline import Filter, Pipeline
+
+        # 2nd-order Butterworth high-pass (1 Hz at 256 Hz)
+        w0 = 2 * np.pi * 1 / 256
+        alpha = np.sin(w0) / np.sqrt(2)
+        b = np.array([1, -2, 1]) * (1 + np.cos(w0)) / 2
+        a = [1 + alpha, -2 * np.cos(w0), 1 - alpha]
+        self.pipeline = Pipeline([Filter(b, a)])
+        self.data = np.random.default_rng(42).normal(size=(5, 12))
+        self.timestamps = np.arange(12) / 256
+
+    def time_filter(self):
+        for _ in range(100):
+            self.pipeline(self.data, self.timestamps)
@@ -0,0 +1,78 @@
+"""Data path of the viewer (pulling, concatenating and rescaling), without rendering."""
+
+import numpy as np
+
+from MuseLSL2.view import Device, Spectrogram
+
+
+class _Info:
+    def __init__(self, n_channels, sfreq):
+        self.sfreq = sfreq
+        self.desc = None
+        self.source_id = "Muse_benchmark"
+        self.ch_names = [f"CH{i}" for i in range(n_channels)]
+
+    def get_channel_names(self):
+        return self.ch_names
+
+
+class _Inlet:
+    """Inlet returning the same chunk at each pull."""
+
+    def __init__(self, n_channels, sfreq, n_samples):
+        rng = np.random.default_rng(42)
+        self.info = _Info(n_channels, sfreq)
+        self.samples = rng.normal(size=(n_samples, n_channels))
+        self.timestamps = np.arange(n_samples) / sfreq
+        self.samples_available = 0
+
+    def open_stream(self):
+        pass
+
+    def get_sinfo(self):
+        return self.info
+
+    def pull_chunk(self, timeout=0, max_samples=1024):
+        return self.samples, self.timestamps
+
+    def flush(self):
+        return 0
+
+
+class OnTimer:
+    params = [1, 16]
+    param_names = ["devices"]
+
+    def setup(self, n_devices):
+        self.devices = [Device(_Inlet(5, 256, 16), _Inlet(3, 64, 4)) for _ in range(n_devices)]
+        self.spectrograms = [Spectrogram(device) for device in self.devices]
+
+    def time_pull(self, n_devices):
+        for device in self.devices:
+            device.pull()
+
+    def time_plot_data(self, n_devices):
+        for device in self.devices:
+            device.plot_data()
+
+    def time_spectrogram(self, n_devices):
+        # Two pulls (32 samples) give one new column per device
+        for device, spectrogram in zip(self.devices, self.spectrograms):
+            device.pull()
+            device.pull()
+            spectrogram.update()
+
+    def track_spectrogram_after_stall(self, n_devices):
+        """1 if, after a stall longer than the ring, the spectrogram only reads samples still in
+        the ring (the latest columns), 0 otherwise."""
+        device, spectrogram = self.devices[0], self.spectrograms[0]
+        for _ in range(2 * device.ring.capacity // 16):
+            device.pull()
+        reads = []
+        read = device.ring.read
+        device.ring.read = lambda start, stop=None: reads.append((start, stop)) or read(start, stop)
+        columns = spectrogram.update()
+        start, stop = reads[-1]
+        count = device.ring.count
+        fresh = start >= count - device.ring.capacity and count - stop < spectrogram.hop
+        return int(fresh and columns.shape[1] == spectrogram.max_columns)
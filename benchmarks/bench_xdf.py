@@ -0,0 +1,47 @@
+"""Loading the sample recordings."""
+
+import os
+
+import tempfile
+
+import pyxdf
+
+from MuseLSL2.archive import read_archive, write_archive
+
+from .fixtures import XDF_FILES
+
+
+class LoadXDF:
+    params = [os.path.basename(f) for f in XDF_FILES]
+    param_names = ["file"]
+    timeout = 120
+
+    def setup(self, file):
+        self.path = XDF_FILES[self.params.index(file)]
+
+    def time_load_xdf(self, file):
+        pyxdf.load_xdf(self.path)
+
+
+class Archive:
+    params = [os.path.basename(f) for f in XDF_FILES]
+    param_names = ["file"]
+    timeout = 120
+
+    def setup(self, file):
+        self.streams, _ = pyxdf.load_xdf(XDF_FILES[self.params.index(file)], dejitter_timestamps=False)
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "archive.musez")
+        write_archive(self.path, self.streams)
+
+    def teardown(self, file):
+        self.dir.cleanup()
+
+    def time_write_archive(self, file):
+        write_archive(self.path, self.streams)
+
+    def time_read_archive(self, file):
+        read_archive(self.path)
+
+    def track_compression_ratio(self, file):
+        return os.path.getsize(XDF_FILES[self.params.index(file)]) / os.path.getsize(self.path)
@@ -0,0 +1,71 @@
+"""Synthetic Muse packets and helpers shared by the benchmarks."""
+
+import glob
+import os
+import struct
+
+import numpy as np
+
+from MuseLSL2.muse import Muse
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "data")
+XDF_FILES = sorted(glob.glob(os.path.join(DATA, "sub-*", "ses-*", "eeg", "*.xdf")))
+
+# Value handles of the EEG (TP9, AF7, AF8, TP10, AUX) and PPG characteristics, in arrival order
+EEG_HANDLES = [44, 41, 38, 32, 35]
+PPG_HANDLES = [56, 59, 62]
+
+
+def eeg_packet(index, codes):
+    """Encode a 16-bit packet index followed by 12 samples of 12 bits."""
+    value = index & 0xFFFF
+    for code in codes:
+        value = (value << 12) | (int(code) & 0xFFF)
+    return value.to_bytes(20, "big")
+
+
+def ppg_packet(index, codes):
+    """Encode a 16-bit packet index followed by 6 samples of 24 bits."""
+    value = index & 0xFFFF
+    for code in codes:
+        value = (value << 24) | (int(code) & 0xFFFFFF)
+    return value.to_bytes(20, "big")
+
+
+def imu_packet(index, codes):
+    """Encode a 16-bit packet index followed by 9 signed samples of 16 bits."""
+    return struct.pack(">H9h", index & 0xFFFF, *codes)
+
+
+def packets(n=256, seed=42):
+    """Random EEG, PPG and IMU packets."""
+    rng = np.random.default_rng(seed)
+    eeg = [eeg_packet(i, rng.integers(0, 4096, 12)) for i in range(n)]
+    ppg = [ppg_packet(i, rng.integers(0, 2**24, 6)) for i in range(n)]
+    imu = [imu_packet(i, rng.integers(-(2**15), 2**15, 9)) for i in range(n)]
+    return eeg, ppg, imu
+
+
+class _NullDevice:
+    """Device accepting commands without any BLE connection."""
+
+    def char_write_handle(self, value_handle, value, wait_for_response=True, timeout=30):
+        pass
+
+
+def make_muse():
+    """Muse instance ready to handle packets, with no-op callbacks."""
+
+    def callback(data, timestamps):
+        pass
+
+    muse = Muse(
+        "00:00:00:00:00:00",
+        callback_eeg=callback,
+        callback_ppg=callback,
+        callback_acc=callback,
+        callback_gyro=callback,
+    )
+    muse.device = _NullDevice()
+    muse.start()
+    return muse